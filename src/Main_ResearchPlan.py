@@ -27,12 +27,11 @@ class MainResearchPlan:
     def MainResearchPlanAlg(self):
         RP = ResearchPlan(self.g, self.d, self.t1, self.t2, self.p, self.K)
         print("Start Research plan algorithm ..\n")
-        G_R, summed_matrices = RP.ResearchPlanAlg()
-        GR_edges = G_R.edges
+        G_R, votes = RP.ResearchPlanAlg()
 
         try:
             visualize_graphs(self.g, G_R, "plots")
-            plot_edge_histograms(self.g.edges, summed_matrices, self.K, GR_edges, )
+            plot_edge_histograms(self.g.edges, votes, self.K, RP.removed_edges)
             push_git_changes()
         except Exception as e:
             print(f"An error occurred while plotting histograms: {str(e)}\n")
@@ -70,15 +69,16 @@ def visualize_graphs(full_graph, refined_graph, output_dir):
     print(f"Refined graph visualization saved to: {refined_graph_path}")
 
 
-def plot_edge_histograms(graph_edges, matrix, max_value, refined_graph_edges, block_size=250, title="Edge Histogram"):
+def plot_edge_histograms(graph_edges, votes, max_value, removed_edges, block_size=250, title="Edge Histogram"):
     """
     Plots histograms in blocks, where the x-axis represents edges in `graph_edges` and the y-axis is the corresponding
-    values in the `matrix`. Saves the plots in a timestamped subdirectory inside `src/plots`.
+    vote counts in `votes`. Saves the plots in a timestamped subdirectory inside `src/plots`.
 
     Args:
         graph_edges (list): List of edges to represent on the x-axis (e.g., `self.g.edges`).
-        matrix (np.ndarray): The matrix containing the values for each edge.
+        votes (VoteAccumulator): The vote counts of the K iterations, read for each edge.
         max_value (int): Maximum value in the matrix (e.g., `self.K`).
+        removed_edges (np.ndarray): The edges RefineGraph removed from the graph.
         block_size (int): Number of edges to include in each plot block.
         title (str): Title of the histogram plots.
     """
@@ -90,16 +90,17 @@ def plot_edge_histograms(graph_edges, matrix, max_value, refined_graph_edges, bl
     # Save config file in run directory
     Config.save_to_json(filename=os.path.join(output_dir, f"RunConfig.json"))
 
-    # Extract values from the matrix based on graph_edges
-    values_from_edges = [matrix[i, j] for i, j in graph_edges]
+    # Extract values from the accumulator based on graph_edges, all edges at once
+    graph_edges = list(graph_edges)
+    values_from_edges = votes.counts_for(graph_edges)
     graph_data_csv_path = os.path.join(output_dir, 'graph_data.csv')
     with open(graph_data_csv_path,mode='w',newline='') as file:
         writer = csv.writer(file)
         writer.writerow(["Edge","Times Restored"])
-        for i,j in graph_edges:
-            writer.writerow([(i,j),matrix[i,j]])
+        for (i, j), value in zip(graph_edges, values_from_edges):
+            writer.writerow([(i, j), value])
     # Extract edges with value 0
-    edges_with_max_value = [(i, j) for i, j in graph_edges if matrix[i, j] == max_value]
+    edges_with_max_value = [edge for edge, value in zip(graph_edges, values_from_edges) if value == max_value]
 
     # Save edges with value 0 to a CSV file
     csv_file_max = os.path.join(output_dir, "edges_with_max_value.csv")
@@ -110,7 +111,7 @@ def plot_edge_histograms(graph_edges, matrix, max_value, refined_graph_edges, bl
 
     print(f"Edges with max value saved to: {csv_file_max}")
     
-    edges_with_value_0 = [(i, j) for i, j in graph_edges if matrix[i, j] == 0]
+    edges_with_value_0 = [edge for edge, value in zip(graph_edges, values_from_edges) if value == 0]
 
     # Save edges with value 0 to a CSV file
     csv_file_0 = os.path.join(output_dir, "edges_with_value_0.csv")
@@ -144,10 +145,7 @@ def plot_edge_histograms(graph_edges, matrix, max_value, refined_graph_edges, bl
     # Add a title
     plt.title(f'Edges Distribution throughout K(={Config.K}) iterations, Threshold t1 = {Config.TRESHOLD1}, Threshold t2 ={Config.TRESHOLD2}')
     # Add conclusion text under the bars
-    edges_removed = 0
-    for u, v in graph_edges:
-        if (u,v) not in refined_graph_edges:
-            edges_removed += 1
+    edges_removed = len(removed_edges)
     conclusion_text = f"Total amount of edges removed from the Graph = {edges_removed}, equals to {(edges_removed / len(graph_edges)) * 100}%"
     conclusion_fileName = "RunConclusions.txt"
 
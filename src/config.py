@@ -16,7 +16,15 @@ class Config:
     NODE2VEC_BATCH_SIZE = 125000
     NODE2VEC_P = 1
     NODE2VEC_Q = 1
+    NODE2VEC_STREAMING = False  # torch backend only
+    NODE2VEC_BACKEND = 'torch'
+    NODE2VEC_SPARSE = False  # torch backend only
     PYRAMID_SCALES = 8
+    MLNE_WORKERS = 1  # pays off with the native backend, the torch feed loop holds the GIL
+    MLNE_WARM_START = False
+    MLNE_WARM_START_ITERATIONS = 1
+    RESEARCH_WORKERS = 1
+    SEED = None
     TQDM_WRITER = None
 
     class Subject(Enum):
@@ -29,7 +37,7 @@ class Config:
         Case_Based = 6
 
     @classmethod
-    def save_to_json(cls, filename):
+    def to_dict(cls):
         # Create a dictionary of only the numeric/string class attributes
         config_dict = {}
         for key, value in vars(cls).items():
@@ -39,7 +47,19 @@ class Config:
                 key != "TQDM_WRITER" and
                 not isinstance(value, classmethod)):
                 config_dict[key] = value
-                
+        return config_dict
+
+    @classmethod
+    def from_dict(cls, config_dict):
+        # Update class attributes
+        for key, value in config_dict.items():
+            if key != "TQDM_WRITER":
+                setattr(cls, key, value)
+
+    @classmethod
+    def save_to_json(cls, filename):
+        config_dict = cls.to_dict()
+
         # Ensure the directory exists
         os.makedirs(os.path.dirname(filename), exist_ok=True)
         
@@ -53,7 +73,4 @@ class Config:
         with open(filename, 'r') as json_file:
             config_dict = json.load(json_file)
             
-        # Update class attributes
-        for key, value in config_dict.items():
-            if key != "TQDM_WRITER":
-                setattr(cls, key, value)
\ No newline at end of file
+        cls.from_dict(config_dict)
\ No newline at end of file
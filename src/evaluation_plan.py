@@ -1,8 +1,7 @@
 import csv
 import datetime
 import os
-import random
-from research_plan import ResearchPlan
+from research_plan import ResearchPlan, PairKeys, SortedLookup
 import numpy as np
 import matplotlib.pyplot as plt
 from config import Config
@@ -23,10 +22,10 @@ class EvaluationPlan:
 
     def EvaluationPlanAlg(self):
         print(f"Adding {self.p}% randomly edges to the graph\n")
-        g_tag, e_tag = AddingEdges(self.g, self.p)
+        g_tag, e_tag = AddingEdges(self.g, self.p, seed=Config.SEED)
         RP = ResearchPlan(g_tag, self.d, self.t1, self.t2, self.p, self.K)
         print("Start Research plan algorithm ..\n")
-        G_R, summed_matrices = RP.ResearchPlanAlg()
+        G_R, votes = RP.ResearchPlanAlg()
         GR_edges = G_R.edges
 
         print("Calculating the success rate ..\n")
@@ -36,7 +35,7 @@ class EvaluationPlan:
                 count += 1
 
         try:
-            plot_edge_histograms(self.g.edges, summed_matrices, self.K, g_tag.edges, e_tag , GR_edges, count)
+            plot_edge_histograms(self.g.edges, votes, self.K, g_tag.edges, e_tag , GR_edges, count)
             push_git_changes()
         except Exception as e:
             print(f"An error occurred while plotting histograms: {str(e)}\n")
@@ -47,14 +46,14 @@ class EvaluationPlan:
         return successRate
 
 
-def plot_edge_histograms(graph_edges, matrix, max_value, manipulated_graph_edges, fake_edges, refined_graph_edges, fake_edges_removed, block_size=250, title="Edge Histogram"):
+def plot_edge_histograms(graph_edges, votes, max_value, manipulated_graph_edges, fake_edges, refined_graph_edges, fake_edges_removed, block_size=250, title="Edge Histogram"):
     """
     Plots histograms in blocks, where the x-axis represents edges in `graph_edges` and the y-axis is the corresponding
-    values in the `matrix`. Saves the plots in a timestamped subdirectory inside `src/plots`.
+    vote counts in `votes`. Saves the plots in a timestamped subdirectory inside `src/plots`.
 
     Args:
         graph_edges (list): List of edges to represent on the x-axis (e.g., `self.g.edges`).
-        matrix (np.ndarray): The matrix containing the values for each edge.
+        votes (VoteAccumulator): The vote counts of the K iterations, read for each edge.
         max_value (int): Maximum value in the matrix (e.g., `self.K`).
         block_size (int): Number of edges to include in each plot block.
         title (str): Title of the histogram plots.
@@ -67,11 +66,12 @@ def plot_edge_histograms(graph_edges, matrix, max_value, manipulated_graph_edges
     # Save config file in run directory
     Config.save_to_json(filename=os.path.join(output_dir, f"RunConfig.json"))
 
-    # Extract values from the matrix based on graph_edges
-    values_from_edges = [matrix[i, j] for i, j in graph_edges]
+    # Extract values from the accumulator based on graph_edges, all edges at once
+    graph_edges = list(graph_edges)
+    values_from_edges = votes.counts_for(graph_edges)
 
     # Extract edges with value 0
-    edges_with_value_0 = [(i, j) for i, j in graph_edges if matrix[i, j] == 0]
+    edges_with_value_0 = [edge for edge, value in zip(graph_edges, values_from_edges) if value == 0]
 
     # Save edges with value 0 to a CSV file
     csv_file_0 = os.path.join(output_dir, "edges_with_value_0.csv")
@@ -132,13 +132,17 @@ def plot_edge_histograms(graph_edges, matrix, max_value, manipulated_graph_edges
     plt.savefig(os.path.join(output_dir, "graph_edges_distribution_BarChart.png"))
 
 
-def AddingEdges(g, p):
+def AddingEdges(g, p, seed=None):
     """
     Randomly adds a percentage of edges to the graph.
 
+    The new edges are drawn by rejection sampling: random node pairs are drawn in batches, and
+    self loops, existing edges (in either orientation) and pairs already drawn are rejected.
+
     Args:
         g (networkx.Graph): The input graph.
         p (float): The percentage of edges to add (0 <= p <= 100).
+        seed (int, optional): Seed of the random pair sampler.
 
     Returns:
         Tuple[networkx.Graph, list]: The modified graph and a list of added edges.
@@ -146,21 +150,45 @@ def AddingEdges(g, p):
     if not (0 <= p <= 100):
         raise ValueError("Percentage p must be between 0 and 100.")
 
-    # Get the list of all possible edges in a fully connected graph
+    rng = np.random.default_rng(seed)
     nodes = list(g.nodes())
-    edges = set(g.edges())
-    possible_edges = set((u, v) for u in nodes for v in nodes if u != v) - edges
+    num_nodes = len(nodes)
+    node_index = {node: i for i, node in enumerate(nodes)}
 
-    # Calculate the number of edges to add
-    num_possible_edges = len(possible_edges)
-    num_to_add = int((p / 100) * len(edges))
+    # Hashed edge index: one sorted integer key per existing edge, whatever its orientation
+    edges = np.array([(node_index[u], node_index[v]) for u, v in g.edges() if u != v], dtype=np.int64).reshape(-1, 2)
+    edge_keys = np.unique(PairKeys(edges[:, 0], edges[:, 1], num_nodes))
 
-    # Randomly sample edges to add
-    edges_to_add = random.sample(possible_edges, min(num_to_add, num_possible_edges))
+    # Calculate the number of edges to add
+    num_possible_edges = num_nodes * (num_nodes - 1) // 2 - len(edge_keys)
+    num_to_add = min(int((p / 100) * g.number_of_edges()), num_possible_edges)
+
+    if num_to_add * 2 > num_possible_edges:
+        # Too dense for rejection sampling, draw directly from the (few) remaining pairs
+        us, vs = np.triu_indices(num_nodes, k=1)
+        candidates = np.setdiff1d(PairKeys(us, vs, num_nodes), edge_keys)
+        added_keys = rng.choice(candidates, size=num_to_add, replace=False)
+        pairs = np.stack([added_keys // num_nodes, added_keys % num_nodes], axis=1)
+    else:
+        pairs = np.zeros((0, 2), dtype=np.int64)
+        added_keys = np.zeros(0, dtype=np.int64)
+        while len(pairs) < num_to_add:
+            batch_size = 2 * (num_to_add - len(pairs)) + 16
+            batch = rng.integers(0, num_nodes, size=(batch_size, 2))
+            batch = batch[batch[:, 0] != batch[:, 1]]
+            keys = PairKeys(batch[:, 0], batch[:, 1], num_nodes)
+            # Keep the first draw of every pair, in drawing order
+            _, first = np.unique(keys, return_index=True)
+            first.sort()
+            batch, keys = batch[first], keys[first]
+            accepted = ~(SortedLookup(keys, edge_keys)[1] | np.isin(keys, added_keys))
+            pairs = np.concatenate([pairs, batch[accepted]])[:num_to_add]
+            added_keys = PairKeys(pairs[:, 0], pairs[:, 1], num_nodes)
+
+    edges_to_add = [(nodes[u], nodes[v]) for u, v in pairs.tolist()]
 
     # Add the edges to the graph
-    for u, v in edges_to_add:
-        g.add_edge(u, v, weight=1)
+    g.add_edges_from(edges_to_add, weight=1)
 
     return g, edges_to_add
 
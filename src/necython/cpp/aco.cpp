@@ -3,57 +3,195 @@
 #include <vector>
 #include <unordered_map>
 #include <iostream>
+#include <algorithm>
+#include <functional>
+#include <thread>
 
 namespace network_embedding {
 
 using std::size_t;
 using std::vector;
 using std::unordered_map;
+using std::function;
+using std::thread;
 
+// Number of node ids a per-node table has to cover
+static size_t NodeIdBound(const CSRGraph & graph) {
+    return graph.nodes().empty() ? 0 : static_cast<size_t>(graph.nodes().back()) + 1;
+}
+
+// Splits the rows of sequences over num_threads workers. Each worker runs
+// deposit(row_begin, row_end, local) against its own buffer indexed by edge id,
+// and the buffers are summed into pheromone once all workers are done, so the
+// workers never write to shared memory.
+static void ParallelDeposit(
+        size_t num_rows,
+        size_t num_edges,
+        size_t num_threads,
+        vector<double> & pheromone,
+        const function<void(size_t, size_t, vector<double> &)> & deposit) {
+    if (num_rows == 0)
+        return;
+    if (num_threads == 0)
+        num_threads = 1;
+    if (num_threads > num_rows)
+        num_threads = num_rows;
+
+    vector<vector<double>> buffers(num_threads);
+    vector<thread> threads;
+    for (size_t i = 0; i < num_threads; i++) {
+        size_t row_begin = num_rows * i / num_threads;
+        size_t row_end = num_rows * (i+1) / num_threads;
+        threads.push_back(thread([&, i, row_begin, row_end]{
+            buffers[i].assign(num_edges, 0.0);
+            deposit(row_begin, row_end, buffers[i]);
+        }));
+    }
+    for (auto &t : threads) {
+        t.join();
+    }
+
+    for (const auto & local : buffers) {
+        for (size_t e = 0; e < num_edges; e++) {
+            pheromone[e] += local[e];
+        }
+    }
+}
+
+// Every position i of a walk whose segment closes at loop_end[i] (0 if it does
+// not close) deposits 1/(loop_end[i]-i) on each step of sequence[i .. loop_end[i]].
+// The segments are added as a difference array, so a row takes O(width) time
+// however long its segments are.
+static void DepositRow(
+        const Node * sequence,
+        size_t width,
+        const vector<size_t> & loop_end,
+        vector<double> & delta,
+        vector<int> & active,
+        const CSRGraph & graph,
+        vector<double> & pheromone) {
+    std::fill(delta.begin(), delta.end(), 0.0);
+    std::fill(active.begin(), active.end(), 0);
+    for (size_t i = 0; i < width; i++) {
+        if (loop_end[i] == 0)
+            continue;
+        double amount = 1.0 / (loop_end[i] - i);
+        delta[i] += amount;
+        delta[loop_end[i]] -= amount;
+        active[i]++;
+        active[loop_end[i]]--;
+    }
+
+    double amount = 0.0;
+    int open = 0;
+    for (size_t k = 0; k+1 < width; k++) {
+        amount += delta[k];
+        open += active[k];
+        if (open == 0) {
+            // Drop the rounding left over from closed segments
+            amount = 0.0;
+            continue;
+        }
+        pheromone[graph.FindEdge(sequence[k], sequence[k+1])] += amount;
+    }
+}
+
+// sequences holds one walk per row of width nodes, as returned by Walker::Walk.
+// A position deposits pheromone along the loop back to its nearest repeat,
+// provided the repeat is less than max_step steps away.
 static void CalculateLoopPheromone(
-        const vector<NodeList> & sequences,
+        const NodeList & sequences,
+        size_t width,
         size_t max_step,
         size_t num_threads,
-        Graph & pheromone) {
-    for (const auto & sequence : sequences) {
-        for (size_t i = 0; i < sequence.size(); i++) {
-            for (size_t len = 1; len < max_step && i+len < sequence.size(); len++) {
-                if (sequence[i] == sequence[i+len]) {
-                    for (size_t k = i; k < i+len; k++) {
-                        const Node & u = sequence[k];
-                        const Node & v = sequence[k+1];
-                        pheromone.SetEdgeWeight(u, v, pheromone.weight(u, v) + 1.0/len);
-                    }
-                    break;
-                }
+        const CSRGraph & graph,
+        vector<double> & pheromone) {
+    size_t num_rows = width == 0 ? 0 : sequences.size() / width;
+    size_t id_bound = NodeIdBound(graph);
+
+    ParallelDeposit(num_rows, graph.number_of_edges(), num_threads, pheromone,
+            [&](size_t row_begin, size_t row_end, vector<double> & local) {
+        vector<size_t> last_seen(id_bound, 0);
+        vector<size_t> loop_end(width);
+        vector<double> delta(width);
+        vector<int> active(width);
+
+        for (size_t row = row_begin; row < row_end; row++) {
+            const Node * sequence = sequences.data() + row * width;
+
+            // Scanning right to left, last_seen holds the next position of
+            // every node (shifted by one, so 0 means not seen yet)
+            for (size_t i = width; i-- > 0; ) {
+                size_t next = last_seen[sequence[i]];
+                loop_end[i] = next != 0 && next-1-i < max_step ? next-1 : 0;
+                last_seen[sequence[i]] = i+1;
+            }
+            for (size_t i = 0; i < width; i++) {
+                last_seen[sequence[i]] = 0;
             }
+
+            DepositRow(sequence, width, loop_end, delta, active, graph, local);
         }
-    }
+    });
 }
 
+// Like CalculateLoopPheromone, with the segment of a position ending at the
+// nearest labeled node after it instead of at its nearest repeat.
 static void CalculatePheromoneWithLabel(
-        const vector<NodeList> & sequences,
-        const unordered_map<Node, vector<int>> labels,
+        const NodeList & sequences,
+        size_t width,
+        const unordered_map<Node, vector<int>> & labels,
         size_t max_step,
         size_t num_threads,
-        Graph & pheromone) {
-    for (const auto & sequence : sequences) {
-        for (size_t i = 0; i < sequence.size(); i++) {
-            for (size_t len = 1; len < max_step && i+len < sequence.size(); len++) {
-                if (labels.find(sequence[i+len]) != labels.end()) {
-                    for (size_t k = i; k < i+len; k++) {
-                        const Node & u = sequence[k];
-                        const Node & v = sequence[k+1];
-                        pheromone.SetEdgeWeight(u, v, pheromone.weight(u, v) + 1.0/len);
-                    }
-                    break;
-                }
+        const CSRGraph & graph,
+        vector<double> & pheromone) {
+    size_t num_rows = width == 0 ? 0 : sequences.size() / width;
+
+    vector<char> labeled(NodeIdBound(graph), 0);
+    for (const auto & label : labels) {
+        if (label.first >= 0 && static_cast<size_t>(label.first) < labeled.size())
+            labeled[label.first] = 1;
+    }
+
+    ParallelDeposit(num_rows, graph.number_of_edges(), num_threads, pheromone,
+            [&](size_t row_begin, size_t row_end, vector<double> & local) {
+        vector<size_t> loop_end(width);
+        vector<double> delta(width);
+        vector<int> active(width);
+
+        for (size_t row = row_begin; row < row_end; row++) {
+            const Node * sequence = sequences.data() + row * width;
+
+            // Next labeled position, shifted by one like last_seen above
+            size_t next = 0;
+            for (size_t i = width; i-- > 0; ) {
+                loop_end[i] = next != 0 && next-1-i < max_step ? next-1 : 0;
+                if (labeled[sequence[i]])
+                    next = i+1;
             }
+
+            DepositRow(sequence, width, loop_end, delta, active, graph, local);
         }
+    });
+}
+
+// One pass over the per-edge state of an iteration: evaporates the total
+// pheromone, adds the pheromone just deposited and mixes the result into the
+// weights the next walks are drawn from.
+static void UpdateEdgeWeights(
+        const vector<double> & base,
+        const vector<double> & pheromone,
+        double alpha,
+        double evaporate,
+        vector<double> & total_pheromone,
+        vector<double> & mixed) {
+    for (size_t e = 0; e < base.size(); e++) {
+        total_pheromone[e] = total_pheromone[e] * (1.0 - evaporate) + pheromone[e];
+        mixed[e] = base[e] * pow(total_pheromone[e], alpha);
     }
 }
 
-Graph ACOWalk(
+CSRGraph ACOWalk(
         const Graph & graph,
         size_t num_walks,
         size_t max_step,
@@ -62,58 +200,47 @@ Graph ACOWalk(
         double evaporate,
         size_t num_threads) {
 
-    Graph g(graph);
-    Graph pheromone(graph);
-    Graph total_pheromone(graph);
-    Graph mixed(graph);
+    // One topology shared by all iterations, with the ACO state kept per edge id
+    CSRGraph g(graph);
+    size_t num_edges = g.number_of_edges();
 
-    if (g.number_of_edges() == 0) {
+    if (num_edges == 0) {
         std::cerr << "Error: Input graph has no edges!" << std::endl;
-        return total_pheromone;
+        return g;
     }
 
-    for (size_t i = 0; i < num_iterations; i++) {
+    const vector<double> base = g.weights();
+    vector<double> pheromone(num_edges);
+    // Both start out as the graph weights, like the graph copies they replace
+    vector<double> total_pheromone = base;
+    vector<double> mixed = base;
 
-        // Initialize walker and simulate walks
-        Walker walker;
-        walker.InitDistributionsFromGraph(mixed, true);
+    Walker walker;
+    walker.InitDistributionsFromGraph(g, true);
 
-        auto sequences = walker.Walk(num_walks, max_step, num_threads);
+    for (size_t i = 0; i < num_iterations; i++) {
 
-        // Reset pheromone weights
-        for (const auto & edge : g.edges()) {
-            pheromone.SetEdgeWeight(edge, 0.0);
-        }
+        // Refresh the walker tables with the mixed weights of the last iteration
+        if (i > 0)
+            walker.UpdateTransitionWeights(g, mixed);
 
-        // Calculate loop pheromone
-        CalculateLoopPheromone(sequences, max_step, num_threads, pheromone);
+        auto sequences = walker.Walk(num_walks, max_step, num_threads);
 
-        // Update total pheromone
-        for (const auto & edge : g.edges()) {
-            double old_weight = total_pheromone.weight(edge);
-            double new_weight = old_weight * (1.0 - evaporate) + pheromone.weight(edge);
-            total_pheromone.SetEdgeWeight(edge, new_weight);
-        }
+        std::fill(pheromone.begin(), pheromone.end(), 0.0);
+        CalculateLoopPheromone(sequences, max_step+1, max_step, num_threads, g, pheromone);
 
-        // Update mixed graph weights
-        for (const auto & edge : g.edges()) {
-            double old_weight = mixed.weight(edge);
-            double new_weight = g.weight(edge) * pow(total_pheromone.weight(edge), alpha);
-            mixed.SetEdgeWeight(edge, new_weight);
-        }
+        UpdateEdgeWeights(base, pheromone, alpha, evaporate, total_pheromone, mixed);
     }
 
     // Final pheromone power adjustment
-    for (const auto & edge : g.edges()) {
-        double old_weight = total_pheromone.weight(edge);
-        double new_weight = pow(old_weight, alpha);
-        total_pheromone.SetEdgeWeight(edge, new_weight);
+    for (size_t e = 0; e < num_edges; e++) {
+        g.SetEdgeWeight(e, pow(total_pheromone[e], alpha));
     }
 
-    return total_pheromone;
+    return g;
 }
 
-Graph ACOWalkWithLabel(
+CSRGraph ACOWalkWithLabel(
         const Graph & graph,
         const unordered_map<Node, vector<int>> labels,
         size_t num_walks,
@@ -123,33 +250,35 @@ Graph ACOWalkWithLabel(
         double evaporate,
         size_t num_threads) {
 
-    Graph g(graph);
-    Graph pheromone(graph);
-    Graph total_pheromone(graph);
-    Graph mixed(graph);
+    CSRGraph g(graph);
+    size_t num_edges = g.number_of_edges();
+    const size_t walk_length = 80;
 
-    for (size_t i = 0; i < num_iterations; i++) {
-        Walker walker;
-        walker.InitDistributionsFromGraph(mixed, true);
-        auto sequences = walker.Walk(num_walks, 80, num_threads);
+    const vector<double> base = g.weights();
+    vector<double> pheromone(num_edges);
+    vector<double> total_pheromone = base;
+    vector<double> mixed = base;
 
-        for (const auto & edge : g.edges()) {
-            pheromone.SetEdgeWeight(edge, 0.0);
-        }
+    Walker walker;
+    walker.InitDistributionsFromGraph(g, true);
 
-        CalculateLoopPheromone(sequences, max_step, num_threads, pheromone);
-        CalculatePheromoneWithLabel(sequences, labels, max_step, num_threads, pheromone);
+    for (size_t i = 0; i < num_iterations; i++) {
+        if (i > 0)
+            walker.UpdateTransitionWeights(g, mixed);
+        auto sequences = walker.Walk(num_walks, walk_length, num_threads);
 
-        for (const auto & edge : g.edges()) {
-            total_pheromone.SetEdgeWeight(edge, total_pheromone.weight(edge) * (1.0-evaporate) + pheromone.weight(edge));
-        }
+        std::fill(pheromone.begin(), pheromone.end(), 0.0);
+        CalculateLoopPheromone(sequences, walk_length+1, max_step, num_threads, g, pheromone);
+        CalculatePheromoneWithLabel(sequences, walk_length+1, labels, max_step, num_threads, g, pheromone);
 
-        for (const auto & edge : g.edges()) {
-            mixed.SetEdgeWeight(edge, g.weight(edge) * pow(total_pheromone.weight(edge), alpha));
-        }
+        UpdateEdgeWeights(base, pheromone, alpha, evaporate, total_pheromone, mixed);
+    }
+
+    for (size_t e = 0; e < num_edges; e++) {
+        g.SetEdgeWeight(e, total_pheromone[e]);
     }
 
-    return total_pheromone;
+    return g;
 }
 
 };
@@ -12,7 +12,7 @@
 
 namespace network_embedding {
 
-Graph ACOWalk(
+CSRGraph ACOWalk(
         const Graph & graph,
         std::size_t num_walks,
         std::size_t max_step,
@@ -21,7 +21,7 @@ Graph ACOWalk(
         double evaporate,
         std::size_t num_threads);
 
-Graph ACOWalkWithLabel(
+CSRGraph ACOWalkWithLabel(
         const Graph & graph,
         const std::unordered_map<Node, std::vector<int>> labels,
         std::size_t num_walks,
@@ -0,0 +1,101 @@
+#include <vector>
+#include <random>
+#include <cstdint>
+#include <algorithm>
+
+#ifndef NETWORK_EMBEDDING_ALIAS_H
+#define NETWORK_EMBEDDING_ALIAS_H
+
+namespace network_embedding {
+
+// Alias tables (Vose's method) for many discrete distributions stored back to
+// back in flat arrays. A distribution occupies the range [begin, end) of the
+// arrays, which callers align with the candidate lists they sample from, and
+// its aliases are kept relative to begin. Draws take O(1) time and a range can
+// be rebuilt in place whenever its weights change.
+class AliasTables {
+    public:
+
+    AliasTables() {}
+
+    inline std::size_t size() const {
+        return probabilities_.size();
+    }
+
+    inline double probability(std::size_t i) const {
+        return probabilities_[i];
+    }
+
+    // Relative to the begin of the range that holds entry i
+    inline std::uint32_t alias(std::size_t i) const {
+        return aliases_[i];
+    }
+
+    inline void Resize(std::size_t size) {
+        probabilities_.resize(size, 1.0);
+        aliases_.resize(size, 0);
+    }
+
+    // Builds the table of [begin, end) from weights[0 .. end-begin). A range
+    // whose weights sum to zero falls back to the uniform distribution.
+    void Build(std::size_t begin, std::size_t end, const double * weights) {
+        std::size_t n = end - begin;
+        if (n == 0)
+            return;
+
+        double total = 0.0;
+        for (std::size_t i = 0; i < n; i++)
+            total += weights[i];
+
+        small_.clear();
+        large_.clear();
+        for (std::size_t i = 0; i < n; i++) {
+            double scaled = total > 0.0 ? weights[i] * n / total : 1.0;
+            probabilities_[begin+i] = scaled;
+            aliases_[begin+i] = static_cast<std::uint32_t>(i);
+            if (scaled < 1.0)
+                small_.push_back(static_cast<std::uint32_t>(i));
+            else
+                large_.push_back(static_cast<std::uint32_t>(i));
+        }
+
+        while (!small_.empty() && !large_.empty()) {
+            std::uint32_t s = small_.back(), l = large_.back();
+            small_.pop_back();
+            aliases_[begin+s] = l;
+            probabilities_[begin+l] -= 1.0 - probabilities_[begin+s];
+            if (probabilities_[begin+l] < 1.0) {
+                large_.pop_back();
+                small_.push_back(l);
+            }
+        }
+
+        // Whatever is left is only off from 1 by rounding
+        for (auto i : small_)
+            probabilities_[begin+i] = 1.0;
+        for (auto i : large_)
+            probabilities_[begin+i] = 1.0;
+    }
+
+    // Returns an index in [begin, end); the range must not be empty.
+    template <typename RandomNumberGenerator>
+    inline std::size_t Sample(std::size_t begin, std::size_t end, RandomNumberGenerator & rng) const {
+        std::size_t n = end - begin;
+        double x = std::uniform_real_distribution<double>(0.0, static_cast<double>(n))(rng);
+        std::size_t i = std::min(static_cast<std::size_t>(x), n - 1);
+        if (x - i < probabilities_[begin+i])
+            return begin + i;
+        return begin + aliases_[begin+i];
+    }
+
+    private:
+
+    std::vector<double> probabilities_;
+    std::vector<std::uint32_t> aliases_;
+    std::vector<std::uint32_t> small_;
+    std::vector<std::uint32_t> large_;
+};
+
+}; // namespace network_embedding
+
+#endif // NETWORK_EMBEDDING_ALIAS_H
@@ -0,0 +1,72 @@
+#include "coarsening.hpp"
+
+#include <algorithm>
+#include <stdexcept>
+
+namespace network_embedding {
+
+using std::size_t;
+using std::vector;
+
+EdgeArrays ContractGraph(
+        const Node * src,
+        const Node * dst,
+        const double * weight,
+        size_t num_edges,
+        const Node * labels,
+        size_t num_nodes,
+        size_t num_clusters) {
+
+    for (size_t u = 0; u < num_nodes; u++) {
+        if (labels[u] < 0 || static_cast<size_t>(labels[u]) >= num_clusters)
+            throw std::out_of_range("Label is out of the range of the clusters");
+    }
+
+    // Bucket the crossing edges by their smaller super node (counting sort)
+    vector<size_t> offsets(num_clusters+1, 0);
+    for (size_t e = 0; e < num_edges; e++) {
+        if (src[e] < 0 || static_cast<size_t>(src[e]) >= num_nodes || dst[e] < 0 || static_cast<size_t>(dst[e]) >= num_nodes)
+            throw std::out_of_range("Edge endpoint is out of the range of the nodes");
+        Node su = labels[src[e]], sv = labels[dst[e]];
+        if (su != sv)
+            offsets[std::min(su, sv)+1]++;
+    }
+    for (size_t c = 0; c < num_clusters; c++)
+        offsets[c+1] += offsets[c];
+
+    vector<Node> bucket_targets(offsets.back());
+    vector<double> bucket_weights(offsets.back());
+    vector<size_t> cursor(offsets.begin(), offsets.end()-1);
+    for (size_t e = 0; e < num_edges; e++) {
+        Node su = labels[src[e]], sv = labels[dst[e]];
+        if (su == sv)
+            continue;
+        if (su > sv)
+            std::swap(su, sv);
+        bucket_targets[cursor[su]] = sv;
+        bucket_weights[cursor[su]] = weight[e];
+        cursor[su]++;
+    }
+
+    // Merge the parallel edges of each bucket through a row of positions
+    // indexed by the larger super node
+    EdgeArrays coarse;
+    vector<size_t> position(num_clusters, 0);
+    for (size_t su = 0; su < num_clusters; su++) {
+        size_t row_begin = coarse.src.size();
+        for (size_t i = offsets[su]; i < offsets[su+1]; i++) {
+            Node sv = bucket_targets[i];
+            if (position[sv] > row_begin) {
+                coarse.weight[position[sv]-1] += bucket_weights[i];
+                continue;
+            }
+            coarse.src.push_back(static_cast<Node>(su));
+            coarse.dst.push_back(sv);
+            coarse.weight.push_back(bucket_weights[i]);
+            position[sv] = coarse.src.size();
+        }
+    }
+    return coarse;
+}
+
+}; // namespace network_embedding
@@ -0,0 +1,33 @@
+#include <vector>
+
+#include "graph.hpp"
+
+#ifndef NETWORK_EMBEDDING_COARSENING_H
+#define NETWORK_EMBEDDING_COARSENING_H
+
+namespace network_embedding {
+
+// Edges of a contracted graph, every undirected edge listed once with src < dst.
+struct EdgeArrays {
+    NodeList src;
+    NodeList dst;
+    std::vector<double> weight;
+};
+
+// Contracts every node u of the graph given by num_edges (src, dst, weight)
+// rows into the super node labels[u] < num_clusters. Edges inside a super node
+// are dropped and the weights of parallel edges between two super nodes are
+// summed. Runs in O(num_edges + num_clusters) time, listing the coarse edges
+// by their smaller super node.
+EdgeArrays ContractGraph(
+        const Node * src,
+        const Node * dst,
+        const double * weight,
+        std::size_t num_edges,
+        const Node * labels,
+        std::size_t num_nodes,
+        std::size_t num_clusters);
+
+}; // namespace network_embedding
+
+#endif // NETWORK_EMBEDDING_COARSENING_H
@@ -1,3 +1,5 @@
+#include "common.hpp"
+
 #include <random>
 #include <thread>
 
@@ -9,4 +11,8 @@ using std::hash;
 
 thread_local default_random_engine random_number_generator(clock() + hash<thread::id>()(std::this_thread::get_id()));
 
+void SetRandomSeed(unsigned int seed) {
+    random_number_generator.seed(seed);
+}
+
 };
\ No newline at end of file
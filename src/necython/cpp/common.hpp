@@ -0,0 +1,16 @@
+#include <random>
+
+#ifndef NETWORK_EMBEDDING_COMMON_H
+#define NETWORK_EMBEDDING_COMMON_H
+
+namespace network_embedding {
+
+extern thread_local std::default_random_engine random_number_generator;
+
+// Reseeds the generator of the calling thread. Worker threads draw their
+// seeds from it, so every run started from the same seed is reproducible.
+void SetRandomSeed(unsigned int seed);
+
+}; // namespace network_embedding
+
+#endif // NETWORK_EMBEDDING_COMMON_H
@@ -0,0 +1,91 @@
+#include <vector>
+#include <numeric>
+#include <cstdint>
+#include <stdexcept>
+
+#include "graph.hpp"
+
+#ifndef NETWORK_EMBEDDING_DISJOINT_SET_H
+#define NETWORK_EMBEDDING_DISJOINT_SET_H
+
+namespace network_embedding {
+
+// Union-find over the nodes 0 .. size-1, kept in flat arrays. Union by rank
+// and iterative path compression keep every operation close to O(1) without
+// recursion, however long the chains of merged nodes get.
+class DisjointSet {
+    public:
+
+    explicit DisjointSet(std::size_t size = 0)
+        : parents_(size), ranks_(size, 0), num_components_(size) {
+        std::iota(parents_.begin(), parents_.end(), 0);
+    }
+
+    inline std::size_t size() const {
+        return parents_.size();
+    }
+
+    inline std::size_t num_components() const {
+        return num_components_;
+    }
+
+    Node Find(Node u) {
+        CheckNode(u);
+        Node root = u;
+        while (parents_[root] != root)
+            root = parents_[root];
+        while (parents_[u] != root) {
+            Node next = parents_[u];
+            parents_[u] = root;
+            u = next;
+        }
+        return root;
+    }
+
+    // Returns whether u and v were in different components
+    bool Union(Node u, Node v) {
+        Node u_root = Find(u), v_root = Find(v);
+        if (u_root == v_root)
+            return false;
+        if (ranks_[u_root] < ranks_[v_root])
+            std::swap(u_root, v_root);
+        parents_[v_root] = u_root;
+        if (ranks_[u_root] == ranks_[v_root])
+            ranks_[u_root]++;
+        num_components_--;
+        return true;
+    }
+
+    void UnionEdges(const Node * src, const Node * dst, std::size_t num_edges) {
+        for (std::size_t i = 0; i < num_edges; i++)
+            Union(src[i], dst[i]);
+    }
+
+    // Writes the component of every node to labels[0 .. size). Components are
+    // numbered 0 .. num_components-1 in the order of their smallest node.
+    void Labels(Node * labels) {
+        std::vector<Node> label_of_root(parents_.size(), -1);
+        Node next_label = 0;
+        for (std::size_t u = 0; u < parents_.size(); u++) {
+            Node root = Find(static_cast<Node>(u));
+            if (label_of_root[root] < 0)
+                label_of_root[root] = next_label++;
+            labels[u] = label_of_root[root];
+        }
+    }
+
+    private:
+
+    inline void CheckNode(Node u) const {
+        if (u < 0 || static_cast<std::size_t>(u) >= parents_.size())
+            throw std::out_of_range("Node is out of the range of the disjoint set");
+    }
+
+    NodeList parents_;
+    std::vector<std::uint8_t> ranks_;
+    std::size_t num_components_;
+};
+
+}; // namespace network_embedding
+
+#endif // NETWORK_EMBEDDING_DISJOINT_SET_H
@@ -3,7 +3,7 @@
 #include <unordered_set>
 #include <utility>
 #include <algorithm>
-#include <stdexcept> // For std::out_of_range
+#include <stdexcept> // For std::out_of_range, std::invalid_argument
 
 
 #ifndef NETWORK_EMBEDDING_GRAPH_H
@@ -357,6 +357,149 @@ class Graph {
     EdgeWeight edge_weight_;
 }; // class Graph
 
+// Immutable compressed sparse row view of a Graph. Rows are indexed by node
+// id, every row keeps its neighbors sorted, and each undirected edge gets an
+// id in [0, number_of_edges()) that both of its slots point to. Only the edge
+// weights can change after construction, and they are updated by edge id.
+class CSRGraph {
+    public:
+
+    static constexpr std::size_t npos = static_cast<std::size_t>(-1);
+
+    CSRGraph() : offsets_(1, 0) {}
+
+    explicit CSRGraph(const Graph & graph) {
+        for (const auto & node : graph.nodes()) {
+            if (node < 0)
+                throw std::invalid_argument("CSRGraph requires non-negative node ids");
+            nodes_.push_back(node);
+        }
+        std::sort(nodes_.begin(), nodes_.end());
+
+        std::size_t num_rows = nodes_.empty() ? 0 : static_cast<std::size_t>(nodes_.back()) + 1;
+        offsets_.assign(num_rows + 1, 0);
+        for (const auto & u : nodes_)
+            offsets_[u+1] = graph.degree(u);
+        for (std::size_t u = 0; u < num_rows; u++)
+            offsets_[u+1] += offsets_[u];
+
+        neighbors_.resize(offsets_.back());
+        for (const auto & u : nodes_) {
+            const NodeSet & n_u = graph.neighbors(u);
+            auto first = neighbors_.begin() + offsets_[u];
+            std::copy(n_u.begin(), n_u.end(), first);
+            std::sort(first, first + n_u.size());
+        }
+
+        // Rows are visited in id order, so the edge (u,v) with u <= v is met
+        // from u first and both of its slots are filled at once.
+        edge_ids_.assign(neighbors_.size(), std::size_t(npos));
+        reverse_slots_.assign(neighbors_.size(), std::size_t(npos));
+        for (const auto & u : nodes_) {
+            for (std::size_t slot = offsets_[u]; slot < offsets_[u+1]; slot++) {
+                const Node & v = neighbors_[slot];
+                if (v < u)
+                    continue;
+                std::size_t reverse = u == v ? slot : FindSlot(v, u);
+                edge_ids_[slot] = edge_ids_[reverse] = edges_.size();
+                reverse_slots_[slot] = reverse;
+                reverse_slots_[reverse] = slot;
+                edges_.push_back({u, v});
+                weights_.push_back(graph.weight(u, v));
+            }
+        }
+    }
+
+    inline const NodeList & nodes() const {
+        return nodes_;
+    }
+
+    inline std::size_t number_of_nodes() const {
+        return nodes_.size();
+    }
+
+    inline std::size_t number_of_edges() const {
+        return edges_.size();
+    }
+
+    // Every edge has one slot per endpoint, self loops have a single one.
+    inline std::size_t number_of_slots() const {
+        return neighbors_.size();
+    }
+
+    // First slot of the row of u; the row spans [offset(u), offset(u)+degree(u)).
+    inline std::size_t offset(const Node & u) const {
+        return offsets_[u];
+    }
+
+    inline std::size_t degree(const Node & u) const {
+        if (u < 0 || static_cast<std::size_t>(u) + 1 >= offsets_.size())
+            return 0;
+        return offsets_[u+1] - offsets_[u];
+    }
+
+    inline const Node & neighbor(std::size_t slot) const {
+        return neighbors_[slot];
+    }
+
+    inline std::size_t edge_id(std::size_t slot) const {
+        return edge_ids_[slot];
+    }
+
+    // Slot of the same edge seen from the other endpoint.
+    inline std::size_t reverse_slot(std::size_t slot) const {
+        return reverse_slots_[slot];
+    }
+
+    inline double slot_weight(std::size_t slot) const {
+        return weights_[edge_ids_[slot]];
+    }
+
+    inline const Edge & edge(std::size_t edge_id) const {
+        return edges_[edge_id];
+    }
+
+    inline double weight(std::size_t edge_id) const {
+        return weights_[edge_id];
+    }
+
+    inline const std::vector<double> & weights() const {
+        return weights_;
+    }
+
+    inline void SetEdgeWeight(std::size_t edge_id, double weight) {
+        weights_[edge_id] = weight;
+    }
+
+    inline std::size_t FindSlot(const Node & u, const Node & v) const {
+        if (degree(u) == 0)
+            return npos;
+        auto first = neighbors_.begin() + offsets_[u];
+        auto last = neighbors_.begin() + offsets_[u+1];
+        auto it = std::lower_bound(first, last, v);
+        if (it == last || *it != v)
+            return npos;
+        return static_cast<std::size_t>(it - neighbors_.begin());
+    }
+
+    inline std::size_t FindEdge(const Node & u, const Node & v) const {
+        std::size_t slot = FindSlot(u, v);
+        if (slot == npos)
+            throw std::out_of_range("CSRGraph has no such edge");
+        return edge_ids_[slot];
+    }
+
+    private:
+
+    NodeList nodes_;
+    std::vector<std::size_t> offsets_;
+    NodeList neighbors_;
+    std::vector<std::size_t> edge_ids_;
+    std::vector<std::size_t> reverse_slots_;
+    std::vector<Edge> edges_;
+    std::vector<double> weights_;
+}; // class CSRGraph
+
 }; // namespace network_embedding
 
 #endif // NETWORK_EMBEDDING_GRAPH_H
\ No newline at end of file
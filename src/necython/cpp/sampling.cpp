@@ -1,157 +1,155 @@
 #include "sampling.hpp"
 
-#include <iostream>
 #include <vector>
-#include <unordered_map>
 #include <random>
 #include <algorithm>
-#include <functional>
+#include <cmath>
 
 namespace network_embedding {
 
 using std::vector;
-using std::unordered_map;
+using std::size_t;
 using std::default_random_engine;
 using std::uniform_real_distribution;
+using std::uniform_int_distribution;
 using std::min;
 using std::max;
-using std::function;
-using std::cout;
-using std::endl;
+using std::swap;
 
 extern thread_local default_random_engine random_number_generator;
 
-vector<NodeList> DownSampling(const vector<NodeList> & sequences, double threshold) {
-    vector<NodeList> result;
-    unordered_map<Node, double> probs;
-    size_t sequences_size = 0;
-    for (const auto & sequence : sequences) {
-        for (const auto & node : sequence) {
-            if (probs.find(node) == probs.end())
-                probs[node] = 0.0;
-            probs[node] += 1.0;
-            sequences_size += 1;
-        }
-    }
+static SequenceSet Rows(const Node * sequences, size_t num_sequences, size_t length) {
+    SequenceSet rows{sequences, vector<size_t>(num_sequences+1)};
+    for (size_t i = 0; i <= num_sequences; i++)
+        rows.offsets[i] = i*length;
+    return rows;
+}
 
-    for (auto & node_prob : probs) {
-        double & prob = node_prob.second;
+SequenceSet DownSampling(const SequenceSet & sequences, double threshold, NodeList & buffer) {
+    const Node * first = sequences.nodes + sequences.offsets.front();
+    const Node * last = sequences.nodes + sequences.offsets.back();
+
+    vector<double> probs(first == last ? 0 : *std::max_element(first, last) + 1, 0.0);
+    for (const Node * node = first; node != last; node++)
+        probs[*node] += 1.0;
+
+    double sequences_size = static_cast<double>(last - first);
+    for (auto & prob : probs) {
+        if (prob == 0.0)
+            continue;
         prob = prob / sequences_size;
         prob = sqrt(threshold/prob) + threshold/prob;
     }
 
+    buffer.resize(last - first);
+    vector<size_t> offsets(1, 0);
     uniform_real_distribution<> dist(0,1);
-    for (const auto & sequence : sequences) {
-        NodeList filtered;
-        for (const auto & node : sequence) {
-            const double & prob = probs[node];
-            if (dist(random_number_generator) - prob < 0) {
-                filtered.push_back(node);
+    size_t kept = 0;
+    for (size_t i = 0; i < sequences.size(); i++) {
+        size_t begin = kept;
+        for (size_t k = sequences.offsets[i]; k < sequences.offsets[i+1]; k++) {
+            const Node & node = sequences.nodes[k];
+            if (dist(random_number_generator) - probs[node] < 0) {
+                buffer[kept++] = node;
             }
         }
-        if(filtered.size() > 2)
-            result.push_back(filtered);
+        if (kept - begin > 2)
+            offsets.push_back(kept);
+        else
+            kept = begin;
     }
+    buffer.resize(kept);
 
-    return result;
+    return SequenceSet{buffer.data(), offsets};
 }
 
-vector<NodeList> SlidingWindow(const vector<NodeList> & sequences, size_t window_size) {
-    vector<NodeList> samples;
-    int distance = (window_size+1)/2;
-    for (const auto & seq : sequences) {
-        for (int i = 0; i < seq.size(); i++) {
-            int lb = max(0, i-distance), ub = min(int(seq.size()), i+distance+1);
-            for(int j = lb; j < i; j++) {
-                samples.push_back({seq[i], seq[j]});
+NodeList SlidingWindow(const SequenceSet & sequences, size_t window_size) {
+    size_t distance = (window_size+1)/2;
+
+    size_t num_pairs = 0;
+    for (size_t s = 0; s < sequences.size(); s++) {
+        size_t n = sequences.offsets[s+1] - sequences.offsets[s];
+        for (size_t i = 0; i < n; i++)
+            num_pairs += min(n, i+distance+1) - (i > distance ? i-distance : 0) - 1;
+    }
+
+    NodeList samples(2*num_pairs);
+    Node * out = samples.data();
+    for (size_t s = 0; s < sequences.size(); s++) {
+        const Node * seq = sequences.nodes + sequences.offsets[s];
+        size_t n = sequences.offsets[s+1] - sequences.offsets[s];
+        for (size_t i = 0; i < n; i++) {
+            size_t lb = i > distance ? i-distance : 0, ub = min(n, i+distance+1);
+            for (size_t j = lb; j < i; j++) {
+                *out++ = seq[i];
+                *out++ = seq[j];
             }
-            for(int j = i+1; j < ub; j++) {
-                samples.push_back({seq[i], seq[j]});
+            for (size_t j = i+1; j < ub; j++) {
+                *out++ = seq[i];
+                *out++ = seq[j];
             }
         }
     }
     return samples;
 }
 
-vector<NodeList> Skipping(const vector<NodeList> & sequences, size_t distance) {
-    vector<NodeList> samples;
-    for (const auto & seq : sequences) {
-        size_t ub = seq.size()-distance;
-        for (size_t i = 0; i < ub; i++) {
-            samples.push_back({seq[i], seq[i+distance]});
+NodeList Skipping(const SequenceSet & sequences, size_t distance) {
+    size_t num_pairs = 0;
+    for (size_t s = 0; s < sequences.size(); s++) {
+        size_t n = sequences.offsets[s+1] - sequences.offsets[s];
+        num_pairs += n > distance ? n-distance : 0;
+    }
+
+    NodeList samples(2*num_pairs);
+    Node * out = samples.data();
+    for (size_t s = 0; s < sequences.size(); s++) {
+        const Node * seq = sequences.nodes + sequences.offsets[s];
+        size_t n = sequences.offsets[s+1] - sequences.offsets[s];
+        for (size_t i = 0; i + distance < n; i++) {
+            *out++ = seq[i];
+            *out++ = seq[i+distance];
         }
     }
     return samples;
 }
 
-vector<NodeList> SequencesProcessingPipeline(const vector<NodeList> & sequences, const vector<function<void(vector<NodeList>&)>> & pipeline) {
-    vector<NodeList> sequences_buffer = sequences;
-    for (auto & func : pipeline) {
-        func(sequences_buffer);
+void ShufflePairs(NodeList & pairs) {
+    size_t num_pairs = pairs.size()/2;
+    for (size_t i = num_pairs; i > 1; i--) {
+        size_t j = uniform_int_distribution<size_t>(0, i-1)(random_number_generator);
+        swap(pairs[2*(i-1)], pairs[2*j]);
+        swap(pairs[2*(i-1)+1], pairs[2*j+1]);
     }
-    return sequences_buffer;
 }
 
-vector<NodeList> WindowSampling(const vector<NodeList> & sequences, size_t window_size, double down_sampling, bool shuffle) {
-    vector<function<void(vector<NodeList>&)>> pipeline;
+NodeList WindowSampling(const Node * sequences, size_t num_sequences, size_t length, size_t window_size, double down_sampling, bool shuffle) {
+    SequenceSet rows = Rows(sequences, num_sequences, length);
 
-    if (down_sampling > 0) {
-        pipeline.push_back(
-            [&](vector<NodeList> & seq) -> void {
-                auto buffer = DownSampling(seq, down_sampling);
-                seq = move(buffer);
-            }
-        );
-    }
+    NodeList buffer;
+    if (down_sampling > 0)
+        rows = DownSampling(rows, down_sampling, buffer);
 
-    pipeline.push_back(
-        [&](vector<NodeList> & seq) -> void {
-            auto buffer = SlidingWindow(seq, window_size);
-            seq = move(buffer);
-        }
-    );
+    NodeList samples = SlidingWindow(rows, window_size);
 
-    if (shuffle) {
-        pipeline.push_back(
-            [&](vector<NodeList> & seq) ->void {
-                random_shuffle(seq.begin(), seq.end());
-            }
-        );
-    }
+    if (shuffle)
+        ShufflePairs(samples);
 
-    return SequencesProcessingPipeline(sequences, pipeline);
+    return samples;
 }
 
-// vector<NodeList> WindowSampling(const vector<NodeList> & sequences, size_t window_size, double down_sampling, bool shuffle) {
-//     return SlidingWindow(sequences, window_size);
-// }
+NodeList SkipSampling(const Node * sequences, size_t num_sequences, size_t length, size_t distance, double down_sampling, bool shuffle) {
+    SequenceSet rows = Rows(sequences, num_sequences, length);
 
-vector<NodeList> SkipSampling(const vector<NodeList> & sequences, size_t distance, double down_sampling, bool shuffle) {
-    vector<function<void(vector<NodeList>&)>> pipeline;
+    NodeList buffer;
+    if (down_sampling > 0)
+        rows = DownSampling(rows, down_sampling, buffer);
 
-    if (down_sampling > 0) {
-        pipeline.push_back(
-            [&](vector<NodeList> & seq) -> void {
-                seq = move(DownSampling(seq, down_sampling));
-            }
-        );
-    }
+    NodeList samples = Skipping(rows, distance);
 
-    pipeline.push_back(
-        [&](vector<NodeList> & seq) -> void {
-            seq = move(Skipping(seq, distance));
-        }
-    );
+    if (shuffle)
+        ShufflePairs(samples);
 
-    if (shuffle) {
-        pipeline.push_back(
-            [&](vector<NodeList> & seq) ->void {
-                random_shuffle(seq.begin(), seq.end());
-            }
-        );
-    }
-
-    return SequencesProcessingPipeline(sequences, pipeline);
+    return samples;
 }
 
-};
\ No newline at end of file
+};
@@ -1,7 +1,5 @@
-#include <unordered_set>
-#include <unordered_map>
+#include <vector>
 #include <utility>
-#include <functional>
 
 #include "graph.hpp"
 
@@ -10,12 +8,31 @@
 
 namespace network_embedding {
 
-std::vector<NodeList> DownSampling(const std::vector<NodeList> & sequences, double threshold);
-std::vector<NodeList> SlidingWindow(const std::vector<NodeList> & sequences, std::size_t window_size);
-std::vector<NodeList> Skipping(const std::vector<NodeList> & sequences, std::size_t distance);
-std::vector<NodeList> SequencesProcessingPipeline(const std::vector<NodeList> & sequences, const std::vector<std::function<void(std::vector<NodeList>&)>> & pipeline);
-std::vector<NodeList> WindowSampling(const std::vector<NodeList> & sequences, std::size_t window_size, double down_sampling, bool shuffle);
-std::vector<NodeList> SkipSampling(const std::vector<NodeList> & sequences, std::size_t distance, double down_sampling, bool shuffle);
+// Sequences stored back to back: sequence i spans [offsets[i], offsets[i+1]) of nodes.
+struct SequenceSet {
+    const Node * nodes;
+    std::vector<std::size_t> offsets;
+
+    inline std::size_t size() const {
+        return offsets.size() - 1;
+    }
+};
+
+// Keeps every node with probability sqrt(t/f)+t/f, f being its frequency, and
+// drops the sequences left with fewer than three nodes. The kept nodes are
+// compacted into buffer, which backs the returned set.
+SequenceSet DownSampling(const SequenceSet & sequences, double threshold, NodeList & buffer);
+
+// The pair builders return (center, context) pairs as consecutive nodes of a
+// flat buffer, sized exactly before it is filled.
+NodeList SlidingWindow(const SequenceSet & sequences, std::size_t window_size);
+NodeList Skipping(const SequenceSet & sequences, std::size_t distance);
+void ShufflePairs(NodeList & pairs);
+
+// The samplers read num_sequences walks of length nodes each, stored row by row
+// in one buffer as returned by ParallelWalker::Walk.
+NodeList WindowSampling(const Node * sequences, std::size_t num_sequences, std::size_t length, std::size_t window_size, double down_sampling, bool shuffle);
+NodeList SkipSampling(const Node * sequences, std::size_t num_sequences, std::size_t length, std::size_t distance, double down_sampling, bool shuffle);
 
 }; // namespace network_embedding
 
@@ -0,0 +1,138 @@
+#include "sgns.hpp"
+
+#include <vector>
+#include <cmath>
+#include <random>
+#include <thread>
+#include <algorithm>
+#include <stdexcept>
+
+#include "alias.hpp"
+
+namespace network_embedding {
+
+using std::size_t;
+using std::vector;
+using std::thread;
+using std::min;
+using std::exp;
+using std::pow;
+using std::sqrt;
+using std::round;
+using std::default_random_engine;
+using std::uniform_real_distribution;
+
+extern thread_local default_random_engine random_number_generator;
+
+// Gradient step on -log(sigmoid(sign * <embedding, context>)). The context is
+// updated right away, the embedding gradient is accumulated in grad.
+static inline void UpdatePair(const float * embedding, float * context, float * grad, size_t dimension, float sign, float learning_rate) {
+    float dot = 0.f;
+    for (size_t k = 0; k < dimension; k++)
+        dot += embedding[k] * context[k];
+    float g = learning_rate * sign / (1.f + exp(sign * dot));
+    for (size_t k = 0; k < dimension; k++) {
+        grad[k] += g * context[k];
+        context[k] += g * embedding[k];
+    }
+}
+
+void TrainSkipGram(
+        const Node * sequences,
+        size_t num_sequences,
+        size_t length,
+        float * embeddings,
+        float * contexts,
+        size_t num_nodes,
+        size_t dimension,
+        size_t window_size,
+        size_t neg_ratio,
+        double neg_power,
+        double down_sampling,
+        double learning_rate,
+        size_t num_threads) {
+
+    size_t total = num_sequences*length;
+    vector<double> counts(num_nodes, 0.0);
+    for (size_t i = 0; i < total; i++) {
+        const Node & node = sequences[i];
+        if (node < 0 || static_cast<size_t>(node) >= num_nodes)
+            throw std::invalid_argument("walks contain a node outside of the embedding table");
+        counts[node] += 1.0;
+    }
+    if (total == 0 || num_nodes == 0)
+        return;
+
+    vector<double> weights(num_nodes);
+    for (size_t u = 0; u < num_nodes; u++)
+        weights[u] = pow(counts[u], neg_power);
+    AliasTables negatives;
+    negatives.Resize(num_nodes);
+    negatives.Build(0, num_nodes, weights.data());
+
+    // Same keep probabilities as DownSampling
+    vector<double> keep(num_nodes, 1.0);
+    if (down_sampling > 0) {
+        for (size_t u = 0; u < num_nodes; u++) {
+            double freq = counts[u] / total;
+            keep[u] = freq > 0 ? sqrt(down_sampling/freq) + down_sampling/freq : 0.0;
+        }
+    }
+
+    if (num_threads == 0 || num_sequences <= num_threads)
+        num_threads = 1;
+
+    vector<unsigned int> seeds(num_threads);
+    for (auto & seed : seeds)
+        seed = random_number_generator();
+
+    size_t distance = (window_size+1)/2;
+    vector<thread> threads;
+    for (size_t i = 0; i < num_threads; i++) {
+        size_t start_idx = static_cast<size_t>(round(static_cast<double>(num_sequences)/num_threads*i));
+        size_t end_idx = static_cast<size_t>(round(static_cast<double>(num_sequences)/num_threads*(i+1)));
+
+        threads.push_back(thread([&, start_idx, end_idx, seed = seeds[i]]{
+            random_number_generator.seed(seed);
+            uniform_real_distribution<double> uniform(0, 1);
+            NodeList kept;
+            vector<float> grad(dimension);
+            float lr = static_cast<float>(learning_rate);
+
+            for (size_t s = start_idx; s < end_idx; s++) {
+                const Node * seq = sequences + s*length;
+                kept.clear();
+                for (size_t k = 0; k < length; k++) {
+                    if (down_sampling <= 0 || uniform(random_number_generator) < keep[seq[k]])
+                        kept.push_back(seq[k]);
+                }
+                if (down_sampling > 0 && kept.size() <= 2)
+                    continue;
+
+                size_t n = kept.size();
+                for (size_t c = 0; c < n; c++) {
+                    float * embedding = embeddings + kept[c]*dimension;
+                    size_t lb = c > distance ? c-distance : 0, ub = min(n, c+distance+1);
+                    for (size_t j = lb; j < ub; j++) {
+                        if (j == c)
+                            continue;
+                        std::fill(grad.begin(), grad.end(), 0.f);
+                        UpdatePair(embedding, contexts + kept[j]*dimension, grad.data(), dimension, 1.f, lr);
+                        for (size_t r = 0; r < neg_ratio; r++) {
+                            size_t negative = negatives.Sample(0, num_nodes, random_number_generator);
+                            UpdatePair(embedding, contexts + negative*dimension, grad.data(), dimension, -1.f, lr);
+                        }
+                        for (size_t k = 0; k < dimension; k++)
+                            embedding[k] += grad[k];
+                    }
+                }
+            }
+        }));
+    }
+
+    for (auto &t : threads) {
+        t.join();
+    }
+}
+
+};
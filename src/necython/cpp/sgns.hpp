@@ -0,0 +1,32 @@
+#include <vector>
+
+#include "graph.hpp"
+
+#ifndef NETWORK_EMBEDDING_SGNS_H
+#define NETWORK_EMBEDDING_SGNS_H
+
+namespace network_embedding {
+
+// Runs one epoch of skip-gram with negative sampling over num_sequences walks
+// of length nodes each, stored row by row as returned by ParallelWalker::Walk.
+// Pairs are taken from the same window as SlidingWindow, and negatives are
+// drawn from the walk counts raised to neg_power. The num_nodes x dimension
+// embeddings and contexts are updated in place by num_threads Hogwild workers.
+void TrainSkipGram(
+        const Node * sequences,
+        std::size_t num_sequences,
+        std::size_t length,
+        float * embeddings,
+        float * contexts,
+        std::size_t num_nodes,
+        std::size_t dimension,
+        std::size_t window_size,
+        std::size_t neg_ratio,
+        double neg_power,
+        double down_sampling,
+        double learning_rate,
+        std::size_t num_threads);
+
+}; // namespace network_embedding
+
+#endif // NETWORK_EMBEDDING_SGNS_H
@@ -7,6 +7,7 @@
 #include <thread>
 #include <functional>
 #include <random>
+#include <stdexcept>
 
 #include "graph.hpp"
 
@@ -18,7 +19,6 @@ using std::sqrt;
 using std::default_random_engine;
 using std::uniform_int_distribution;
 using std::uniform_real_distribution;
-using std::discrete_distribution;
 using std::round;
 using std::unordered_map;
 using std::unordered_set;
@@ -35,24 +35,43 @@ using std::function;
 
 extern thread_local default_random_engine random_number_generator;
 
-vector<NodeList> ParallelWalker::Walk(size_t num_walks, size_t walk_length, size_t num_threads) {
-    const NodeList & node_list = get_node_list();
-    size_t num_nodes = node_list.size();
+NodeList ParallelWalker::SimulateWalk(const Node & start_node, size_t walk_length) {
+    NodeList seq(walk_length+1);
+    SimulateWalk(start_node, walk_length, seq.data());
+    return seq;
+}
+
+NodeList ParallelWalker::Walk(size_t num_walks, size_t walk_length, size_t num_threads) {
+    return WalkRange(0, get_node_list().size(), num_walks, walk_length, num_threads);
+}
+
+NodeList ParallelWalker::WalkRange(size_t begin, size_t end, size_t num_walks, size_t walk_length, size_t num_threads) {
+    end = min(end, get_node_list().size());
+    begin = min(begin, end);
+    const Node * node_list = get_node_list().data() + begin;
+    size_t num_nodes = end - begin;
+    size_t width = walk_length+1;
 
-    vector<NodeList> sequences(num_nodes*num_walks);
+    NodeList sequences(num_nodes*num_walks*width);
 
     if (num_nodes <= num_threads)
         num_threads = 1;
 
+    // Seed the workers from the calling thread, so a seeded caller gets the same walks every time
+    vector<unsigned int> seeds(num_threads);
+    for (auto & seed : seeds)
+        seed = random_number_generator();
+
     vector<thread> threads;
     for (size_t i = 0; i < num_threads; i++) {
         size_t start_idx = static_cast<size_t>(round(static_cast<double>(num_nodes)/num_threads*i));
         size_t end_idx = static_cast<size_t>(round(static_cast<double>(num_nodes)/num_threads*(i+1)));
 
-        threads.push_back(thread([this, start_idx, end_idx, num_walks, walk_length, &node_list, &sequences]{
+        threads.push_back(thread([this, start_idx, end_idx, num_walks, walk_length, width, node_list, &sequences, seed = seeds[i]]{
+            random_number_generator.seed(seed);
             for (size_t u = start_idx; u < end_idx; u++) {
                 for (size_t w = 0; w < num_walks; w++) {
-                    sequences[u*num_walks+w] = move(SimulateWalk(node_list[u], walk_length));
+                    SimulateWalk(node_list[u], walk_length, sequences.data() + (u*num_walks+w)*width);
                 }
             }
         }));
@@ -72,124 +91,189 @@ void Walker::set_node_list(const NodeList & nodes) {
 }
 
 void Walker::SetTransitionWeights(const Node & node, const NodeList & neighbors, const vector<double> & weights) {
-    distributions_[node] = {neighbors, discrete_distribution<int>(weights.begin(), weights.end())};
+    if (static_cast<size_t>(node) >= ranges_.size())
+        ranges_.resize(node+1, {0, 0});
+    size_t begin = targets_.size(), end = begin + neighbors.size();
+    ranges_[node] = {begin, end};
+    targets_.insert(targets_.end(), neighbors.begin(), neighbors.end());
+    transitions_.Resize(end);
+    transitions_.Build(begin, end, weights.data());
 }
 
 void Walker::InitDistributionsFromGraph(const Graph &graph, bool weighted) {
-    auto make_node_distribution = [weighted, &graph] (const Node & u) -> pair<NodeList, discrete_distribution<int>> {
-        const NodeSet & n_u = graph.neighbors(u);
-        NodeList neighbors(n_u.begin(), n_u.end());
-        vector<double> weights;
-
-        if (weighted) {
-            for (const auto & v : neighbors) {
-                weights.push_back(graph.weight(u, v));
-            }
-        }
-        else {
-            for (const auto & v : neighbors) {
-                weights.push_back(1.);
-            }
-        }
-        return {neighbors, discrete_distribution<int>(weights.begin(), weights.end())};
-    };
+    InitDistributionsFromGraph(CSRGraph(graph), weighted);
+}
 
-    node_list_.clear();
-    distributions_.clear();
-    for (auto && node : graph.nodes()) {
-        node_list_.push_back(node);
-        distributions_[node] = move(make_node_distribution(node));
+void Walker::InitDistributionsFromGraph(const CSRGraph &graph, bool weighted) {
+    const NodeList & nodes = graph.nodes();
+    size_t num_rows = nodes.empty() ? 0 : nodes.back() + 1;
+
+    weighted_ = weighted;
+    node_list_ = nodes;
+    ranges_.assign(num_rows, {0, 0});
+    targets_.resize(graph.number_of_slots());
+    transitions_.Resize(graph.number_of_slots());
+
+    for (const auto & u : nodes) {
+        size_t begin = graph.offset(u), end = begin + graph.degree(u);
+        for (size_t slot = begin; slot < end; slot++)
+            targets_[slot] = graph.neighbor(slot);
+        ranges_[u] = {begin, end};
+    }
+    UpdateTransitionWeights(graph);
+}
+
+void Walker::UpdateTransitionWeights(const CSRGraph &graph) {
+    UpdateTransitionWeights(graph, graph.weights());
+}
+
+void Walker::UpdateTransitionWeights(const CSRGraph &graph, const vector<double> &edge_weights) {
+    if (graph.number_of_slots() != targets_.size())
+        throw std::invalid_argument("Walker was initialized with a different graph");
+    if (edge_weights.size() != graph.number_of_edges())
+        throw std::invalid_argument("Expected one weight per edge of the graph");
+
+    for (const auto & u : node_list_) {
+        size_t begin = graph.offset(u), end = begin + graph.degree(u);
+        weights_.clear();
+        for (size_t slot = begin; slot < end; slot++)
+            weights_.push_back(weighted_ ? edge_weights[graph.edge_id(slot)] : 1.);
+        transitions_.Build(begin, end, weights_.data());
     }
 }
 
-NodeList Walker::SimulateWalk(const Node & start_node, size_t walk_length) {
-    NodeList seq;
+void Walker::SimulateWalk(const Node & start_node, size_t walk_length, Node * seq) {
     int curr_node = start_node;
-    seq.push_back(curr_node);
+    seq[0] = curr_node;
     for (size_t i = 0; i < walk_length; i++) {
-        auto &val = distributions_.at(curr_node);
-        auto &neibors = val.first;
-        auto &dist = val.second;
+        const auto & range = ranges_.at(curr_node);
+        if (range.first == range.second)
+            throw std::out_of_range("Walker has no transitions from the current node");
 
-        int next_node = neibors[dist(random_number_generator)];
-        seq.push_back(next_node);
+        int next_node = targets_[transitions_.Sample(range.first, range.second, random_number_generator)];
+        seq[i+1] = next_node;
         curr_node = next_node;
     }
-    return seq;
 }
 
 void BiasedWalker::InitDistributionsFromGraph(const Graph &graph, double p, double q) {
-    auto make_node_distribution = [&graph] (const Node & u) -> pair<NodeList, uniform_int_distribution<int>> {
-        const NodeSet & n_u = graph.neighbors(u);
-        NodeList neighbors(n_u.begin(), n_u.end());
-        return {neighbors, uniform_int_distribution<int>(0, neighbors.size()-1)};
-    };
-
-    auto make_edge_distribution = [p, q, &graph] (const Edge & edge) -> pair<NodeList, discrete_distribution<int>> {
-        const Node & u = edge.first;
-        const Node & v = edge.second;
-
-        const NodeSet & n_u = graph.neighbors(u);
-        const NodeSet & n_v = graph.neighbors(v);
-
-        NodeList nodes;
-        vector<double> weights;
-
-        nodes.push_back(u);
-        weights.push_back(1.0/p);
+    InitDistributionsFromGraph(CSRGraph(graph), p, q);
+}
 
-        for (const auto &node : n_v) {
-            double weight;
-            if (n_u.find(node) != n_u.end())
-                weight = 1.0;
-            else
-                weight = 1.0/q;
-            nodes.push_back(node);
-            weights.push_back(weight);
+void BiasedWalker::InitDistributionsFromGraph(const CSRGraph &graph, double p, double q) {
+    graph_ = graph;
+    node_list_ = graph.nodes();
+
+    size_t num_slots = graph.number_of_slots();
+    edge_offsets_.assign(num_slots+1, 0);
+    for (size_t slot = 0; slot < num_slots; slot++)
+        edge_offsets_[slot+1] = edge_offsets_[slot] + 1 + graph.degree(graph.neighbor(slot));
+    edge_transitions_.Resize(edge_offsets_.back());
+
+    vector<double> weights;
+    for (const auto & u : node_list_) {
+        size_t u_begin = graph.offset(u), u_end = u_begin + graph.degree(u);
+        for (size_t slot = u_begin; slot < u_end; slot++) {
+            const Node & v = graph.neighbor(slot);
+            size_t v_begin = graph.offset(v), v_end = v_begin + graph.degree(v);
+
+            weights.clear();
+            weights.push_back(1.0/p);
+
+            // Both rows are sorted, so membership in N(u) is a single merge pass
+            size_t cursor = u_begin;
+            for (size_t t = v_begin; t < v_end; t++) {
+                const Node & node = graph.neighbor(t);
+                while (cursor < u_end && graph.neighbor(cursor) < node)
+                    cursor++;
+                if (cursor < u_end && graph.neighbor(cursor) == node)
+                    weights.push_back(1.0);
+                else
+                    weights.push_back(1.0/q);
+            }
+            edge_transitions_.Build(edge_offsets_[slot], edge_offsets_[slot+1], weights.data());
         }
-
-        return {nodes, discrete_distribution<int>(begin(weights), end(weights))};
-    };
-
-    node_list_.clear();
-    node_distributions_.clear();
-    edge_distributions_.clear();
-
-    auto nodes = graph.nodes();
-    auto edges = graph.directed_edges();
-
-    for (const auto & node : nodes) {
-        node_list_.push_back(node);
-        node_distributions_[node] = move(make_node_distribution(node));
     }
+}
 
-    for (const auto & edge : edges) {
-        edge_distributions_[edge] = move(make_edge_distribution(edge));
+void BiasedWalker::SimulateWalk(const Node & start_node, size_t walk_length, Node * seq) {
+    size_t degree = graph_.degree(start_node);
+    if (degree == 0)
+        throw std::out_of_range("BiasedWalker has no transitions from the start node");
+    uniform_int_distribution<size_t> dist(0, degree-1);
+
+    size_t slot = graph_.offset(start_node) + dist(random_number_generator);
+    int prev_node = start_node, curr_node = graph_.neighbor(slot);
+    seq[0] = prev_node;
+    if (walk_length == 0)
+        return;
+    seq[1] = curr_node;
+    for (size_t i = 1; i < walk_length; i++) {
+        int next_node;
+        size_t k = edge_transitions_.Sample(edge_offsets_[slot], edge_offsets_[slot+1], random_number_generator) - edge_offsets_[slot];
+        if (k == 0) {
+            next_node = prev_node;
+            slot = graph_.reverse_slot(slot);
+        }
+        else {
+            slot = graph_.offset(curr_node) + k - 1;
+            next_node = graph_.neighbor(slot);
+        }
+        seq[i+1] = next_node;
+        prev_node = curr_node;
+        curr_node = next_node;
     }
+
 }
 
-NodeList BiasedWalker::SimulateWalk(const Node & start_node, size_t walk_length) {
-    NodeList seq;
+void RejectionBiasedWalker::InitDistributionsFromGraph(const Graph &graph, double p, double q) {
+    InitDistributionsFromGraph(CSRGraph(graph), p, q);
+}
 
-    auto &v = node_distributions_.at(start_node);
-    auto &neibors = v.first;
-    auto &dist = v.second;
+void RejectionBiasedWalker::InitDistributionsFromGraph(const CSRGraph &graph, double p, double q) {
+    graph_ = graph;
+    node_list_ = graph.nodes();
+    return_weight_ = 1.0/p;
+    out_weight_ = 1.0/q;
+    max_weight_ = max(1.0, max(return_weight_, out_weight_));
+}
 
-    int prev_node = start_node, curr_node = neibors[dist(random_number_generator)];
-    seq.push_back(prev_node);
-    seq.push_back(curr_node);
+void RejectionBiasedWalker::SimulateWalk(const Node & start_node, size_t walk_length, Node * seq) {
+    size_t degree = graph_.degree(start_node);
+    if (degree == 0)
+        throw std::out_of_range("RejectionBiasedWalker has no transitions from the start node");
+    uniform_int_distribution<size_t> dist(0, degree-1);
+    uniform_real_distribution<double> acceptance(0.0, max_weight_);
+
+    int prev_node = start_node, curr_node = graph_.neighbor(graph_.offset(start_node) + dist(random_number_generator));
+    seq[0] = prev_node;
+    if (walk_length == 0)
+        return;
+    seq[1] = curr_node;
     for (size_t i = 1; i < walk_length; i++) {
-        auto &v = edge_distributions_.at({prev_node, curr_node});
-        auto &neibors = v.first;
-        auto &dist = v.second;
+        size_t begin = graph_.offset(curr_node);
+        uniform_int_distribution<size_t> outcome(0, graph_.degree(curr_node));
 
-        int next_node = neibors[dist(random_number_generator)];
-        seq.push_back(next_node);
+        int next_node;
+        while (true) {
+            size_t k = outcome(random_number_generator);
+            double weight;
+            if (k == 0) {
+                next_node = prev_node;
+                weight = return_weight_;
+            }
+            else {
+                next_node = graph_.neighbor(begin + k - 1);
+                weight = graph_.FindSlot(prev_node, next_node) != CSRGraph::npos ? 1.0 : out_weight_;
+            }
+            if (weight >= max_weight_ || acceptance(random_number_generator) < weight)
+                break;
+        }
+        seq[i+1] = next_node;
         prev_node = curr_node;
         curr_node = next_node;
     }
 
-    return seq;
 }
 
 };  // namespace network_embedding
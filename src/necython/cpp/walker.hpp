@@ -4,6 +4,7 @@
 #include <functional>
 
 #include "graph.hpp"
+#include "alias.hpp"
 
 #ifndef NETWORK_EMBEDDING_WALKER_H
 #define NETWORK_EMBEDDING_WALKER_H
@@ -15,8 +16,14 @@ class ParallelWalker {
 
     virtual ~ParallelWalker() {}
     virtual const NodeList & get_node_list() const = 0;
-    virtual NodeList SimulateWalk(const Node & start_node, std::size_t walk_length) = 0;
-    virtual std::vector<NodeList> Walk(std::size_t num_walks, std::size_t walk_length, std::size_t num_threads);
+    // Writes the walk_length+1 nodes of a walk from start_node to seq.
+    virtual void SimulateWalk(const Node & start_node, std::size_t walk_length, Node * seq) = 0;
+    NodeList SimulateWalk(const Node & start_node, std::size_t walk_length);
+    // Returns num_walks walks per node of the node list, in that order, as one
+    // flat buffer of rows of walk_length+1 nodes.
+    virtual NodeList Walk(std::size_t num_walks, std::size_t walk_length, std::size_t num_threads);
+    // Same as Walk, for the nodes at positions [begin, end) of the node list only.
+    NodeList WalkRange(std::size_t begin, std::size_t end, std::size_t num_walks, std::size_t walk_length, std::size_t num_threads);
 };
 
 class Walker : public ParallelWalker {
@@ -31,13 +38,25 @@ class Walker : public ParallelWalker {
     void set_node_list(const NodeList & nodes);
 
     void InitDistributionsFromGraph(const Graph &graph, bool weighted);
+    void InitDistributionsFromGraph(const CSRGraph &graph, bool weighted);
+    // Rebuilds the tables in place from new edge weights of the graph the
+    // walker was initialized with.
+    void UpdateTransitionWeights(const CSRGraph &graph);
+    // Same, with the weights given per edge id of graph instead of its own.
+    void UpdateTransitionWeights(const CSRGraph &graph, const std::vector<double> &edge_weights);
     void SetTransitionWeights(const Node & node, const NodeList & neighbors, const std::vector<double> & weights);
-    virtual NodeList SimulateWalk(const Node & start_node, std::size_t walk_length);
+    using ParallelWalker::SimulateWalk;
+    virtual void SimulateWalk(const Node & start_node, std::size_t walk_length, Node * seq);
 
     private:
 
+    bool weighted_ = false;
     NodeList node_list_;
-    std::unordered_map<Node, std::pair<NodeList, std::discrete_distribution<int>>> distributions_;
+    // Indexed by node id: the [begin, end) range of its candidates in targets_
+    std::vector<std::pair<std::size_t, std::size_t>> ranges_;
+    NodeList targets_;
+    AliasTables transitions_;
+    std::vector<double> weights_;
 };
 
 class BiasedWalker : public ParallelWalker {
@@ -51,14 +70,49 @@ class BiasedWalker : public ParallelWalker {
     }
 
     void InitDistributionsFromGraph(const Graph &graph, double p, double q);
+    void InitDistributionsFromGraph(const CSRGraph &graph, double p, double q);
 
-    virtual NodeList SimulateWalk(const Node & start_node, std::size_t walk_length);
+    using ParallelWalker::SimulateWalk;
+    virtual void SimulateWalk(const Node & start_node, std::size_t walk_length, Node * seq);
 
     private:
 
     NodeList node_list_;
-    std::unordered_map<Node, std::pair<NodeList, std::uniform_int_distribution<int>>> node_distributions_;
-    std::unordered_map<Edge, std::pair<NodeList, std::discrete_distribution<int>>, edge_hash> edge_distributions_;
+    CSRGraph graph_;
+    // The table of the directed edge (prev, curr) spans [edge_offsets_[slot],
+    // edge_offsets_[slot+1]) of edge_transitions_. Outcome 0 returns to prev,
+    // outcome k > 0 moves to the (k-1)-th neighbor of curr.
+    std::vector<std::size_t> edge_offsets_;
+    AliasTables edge_transitions_;
+};
+
+// Node2vec walker without per-edge tables. A second order step draws one of
+// the deg(curr)+1 outcomes of BiasedWalker uniformly and accepts it with
+// probability weight/max_weight, which samples the same distribution while
+// keeping only the graph itself in memory.
+class RejectionBiasedWalker : public ParallelWalker {
+
+    public:
+
+    RejectionBiasedWalker() {}
+
+    virtual inline const NodeList & get_node_list() const {
+        return node_list_;
+    }
+
+    void InitDistributionsFromGraph(const Graph &graph, double p, double q);
+    void InitDistributionsFromGraph(const CSRGraph &graph, double p, double q);
+
+    using ParallelWalker::SimulateWalk;
+    virtual void SimulateWalk(const Node & start_node, std::size_t walk_length, Node * seq);
+
+    private:
+
+    NodeList node_list_;
+    CSRGraph graph_;
+    double return_weight_ = 1.0;
+    double out_weight_ = 1.0;
+    double max_weight_ = 1.0;
 };
 
 };
@@ -3,23 +3,74 @@
 #cython: wraparound=False
 #distutils: language=c++
 
+from cpython cimport Py_buffer
 from libcpp cimport bool
 from libcpp.utility cimport pair
-from necpp cimport Graph as CGraph
-from necpp cimport Walker as CWalker, BiasedWalker as CBiasedWalker
+from necpp cimport Node, NodeList, Graph as CGraph, CSRGraph as CCSRGraph
+from necpp cimport Walker as CWalker, BiasedWalker as CBiasedWalker, RejectionBiasedWalker as CRejectionBiasedWalker
 from necpp cimport WindowSampling, SkipSampling
+from necpp cimport TrainSkipGram
 from necpp cimport ACOWalk
+from necpp cimport SetRandomSeed
+from necpp cimport AliasTables
+from necpp cimport DisjointSet as CDisjointSet
+from necpp cimport EdgeArrays, ContractGraph
 
 import networkx as nx
+import numpy as np
+
+cdef class NodeArray:
+    """Owns a flat buffer of nodes from the C++ core and shares it with numpy as a 2-D int32 array."""
+    cdef NodeList data
+    cdef Py_ssize_t shape[2]
+    cdef Py_ssize_t strides[2]
+
+    def __getbuffer__(self, Py_buffer *buffer, int flags):
+        buffer.buf = <char *> self.data.data()
+        buffer.format = 'i'
+        buffer.internal = NULL
+        buffer.itemsize = sizeof(Node)
+        buffer.len = self.data.size() * sizeof(Node)
+        buffer.ndim = 2
+        buffer.obj = self
+        buffer.readonly = 0
+        buffer.shape = self.shape
+        buffer.strides = self.strides
+        buffer.suboffsets = NULL
+
+    def __releasebuffer__(self, Py_buffer *buffer):
+        pass
+
+cdef object as_node_matrix(NodeList & data, size_t num_columns):
+    """Moves data into a NodeArray and returns a (len(data)/num_columns, num_columns) numpy view of it."""
+    cdef NodeArray array = NodeArray.__new__(NodeArray)
+    array.data.swap(data)
+    array.shape[0] = array.data.size() // num_columns
+    array.shape[1] = num_columns
+    array.strides[0] = num_columns * sizeof(Node)
+    array.strides[1] = sizeof(Node)
+    return np.asarray(array)
 
 cdef class Graph:
     cdef CGraph c_graph
 
     @staticmethod
     def from_nx_graph(graph):
-        g = Graph()
-        for u, v in graph.edges:
-            g.c_graph.AddEdge(u, v, graph[u][v]['weight'])
+        cdef size_t num_edges = graph.number_of_edges()
+        edges = np.fromiter((node for edge in graph.edges for node in edge), dtype=np.int32, count=2*num_edges).reshape(num_edges, 2)
+        weights = np.fromiter((weight for _, _, weight in graph.edges(data='weight')), dtype=np.float64, count=num_edges)
+        return Graph.from_arrays(np.ascontiguousarray(edges[:, 0]), np.ascontiguousarray(edges[:, 1]), weights)
+
+    @staticmethod
+    def from_arrays(const int[::1] src, const int[::1] dst, const double[::1] weight):
+        """Build the graph from contiguous int32 endpoint and float64 weight arrays, without holding the GIL."""
+        if src.shape[0] != dst.shape[0] or src.shape[0] != weight.shape[0]:
+            raise ValueError("src, dst and weight must have the same length")
+        cdef Graph g = Graph()
+        cdef Py_ssize_t i
+        with nogil:
+            for i in range(src.shape[0]):
+                g.c_graph.AddEdge(src[i], dst[i], weight[i])
         return g
 
     def __cinit__(self):
@@ -62,7 +113,19 @@ cdef class Walker:
         return self.c_walker.SimulateWalk(start_node, walk_length)
 
     def walk(self, size_t num_walks, size_t walk_length, size_t num_threads):
-        return self.c_walker.Walk(num_walks, walk_length, num_threads)
+        cdef NodeList sequences
+        with nogil:
+            sequences = self.c_walker.Walk(num_walks, walk_length, num_threads)
+        return as_node_matrix(sequences, walk_length+1)
+
+    def walk_range(self, size_t begin, size_t end, size_t num_walks, size_t walk_length, size_t num_threads):
+        cdef NodeList sequences
+        with nogil:
+            sequences = self.c_walker.WalkRange(begin, end, num_walks, walk_length, num_threads)
+        return as_node_matrix(sequences, walk_length+1)
+
+    def number_of_nodes(self):
+        return self.c_walker.get_node_list().size()
 
 cdef class BiasedWalker:
     cdef CBiasedWalker c_walker
@@ -77,33 +140,205 @@ cdef class BiasedWalker:
         return self.c_walker.SimulateWalk(start_node, walk_length)
 
     def walk(self, size_t num_walks, size_t walk_length, size_t num_threads):
-        return self.c_walker.Walk(num_walks, walk_length, num_threads)
+        cdef NodeList sequences
+        with nogil:
+            sequences = self.c_walker.Walk(num_walks, walk_length, num_threads)
+        return as_node_matrix(sequences, walk_length+1)
 
-def window_sampling(list sequences, size_t window_size, double down_sampling, bool shuffle):
-    return WindowSampling(sequences, window_size, down_sampling, shuffle)
+    def walk_range(self, size_t begin, size_t end, size_t num_walks, size_t walk_length, size_t num_threads):
+        cdef NodeList sequences
+        with nogil:
+            sequences = self.c_walker.WalkRange(begin, end, num_walks, walk_length, num_threads)
+        return as_node_matrix(sequences, walk_length+1)
 
-def skip_sampling(list sequences, size_t distance, double down_sampling, bool shuffle):
-    return SkipSampling(sequences, distance, down_sampling, shuffle)
+    def number_of_nodes(self):
+        return self.c_walker.get_node_list().size()
 
-def aco_walk(Graph graph, size_t num_walks, size_t max_step, size_t num_iterations, double alpha, double evaporate, size_t num_threads):
-    print("\tStart executing Algorithm 2 - ACWalk ..\n")
-    g = ACOWalk(graph.c_graph, num_walks, max_step, num_iterations, alpha, evaporate, num_threads)
+cdef class RejectionBiasedWalker:
+    cdef CRejectionBiasedWalker c_walker
 
-    cdef list edge_list = []
-    cdef CGraph.EdgeView edge_view = g.edges()
-    cdef CGraph.EdgeView.Iterator edge_iter = edge_view.begin()
-    cdef CGraph.EdgeView.Iterator edge_end = edge_view.end()
-    cdef pair[int, int] edge
+    def __cinit__(self):
+        self.c_walker = CRejectionBiasedWalker()
+
+    def init_distributions_from_graph(self, Graph graph, double p, double q):
+        self.c_walker.InitDistributionsFromGraph(graph.c_graph, p, q)
+
+    def simulate_walk(self, size_t start_node, size_t walk_length):
+        return self.c_walker.SimulateWalk(start_node, walk_length)
+
+    def walk(self, size_t num_walks, size_t walk_length, size_t num_threads):
+        cdef NodeList sequences
+        with nogil:
+            sequences = self.c_walker.Walk(num_walks, walk_length, num_threads)
+        return as_node_matrix(sequences, walk_length+1)
+
+    def walk_range(self, size_t begin, size_t end, size_t num_walks, size_t walk_length, size_t num_threads):
+        cdef NodeList sequences
+        with nogil:
+            sequences = self.c_walker.WalkRange(begin, end, num_walks, walk_length, num_threads)
+        return as_node_matrix(sequences, walk_length+1)
+
+    def number_of_nodes(self):
+        return self.c_walker.get_node_list().size()
 
-    while edge_iter != edge_end:
-        edge = edge_iter.current()  # Call current() explicitly
-        edge_list.append((edge.first, edge.second))
-        edge_iter.increment()  # Call increment() explicitly
+def set_random_seed(unsigned int seed):
+    """Seed the native random number generator of the calling thread."""
+    SetRandomSeed(seed)
 
-    if len(edge_list) == 0:
+def alias_table(const double[::1] weights):
+    """Builds the Vose alias table of the weights, returned as float64 probabilities and uint32 aliases."""
+    cdef size_t n = weights.shape[0]
+    probabilities = np.ones(n, dtype=np.float64)
+    aliases = np.arange(n, dtype=np.uint32)
+    if n == 0:
+        return probabilities, aliases
+    cdef double[::1] p = probabilities
+    cdef unsigned int[::1] a = aliases
+    cdef AliasTables table
+    cdef size_t i
+    with nogil:
+        table.Resize(n)
+        table.Build(0, n, &weights[0])
+        for i in range(n):
+            p[i] = table.probability(i)
+            a[i] = table.alias(i)
+    return probabilities, aliases
+
+cdef class DisjointSet:
+    """Native union-find over the nodes 0..size-1."""
+    cdef CDisjointSet c_set
+
+    def __cinit__(self, size_t size):
+        self.c_set = CDisjointSet(size)
+
+    def __len__(self):
+        return self.c_set.size()
+
+    @property
+    def num_components(self):
+        return self.c_set.num_components()
+
+    def find(self, Node u):
+        return self.c_set.Find(u)
+
+    def union(self, Node u, Node v):
+        return self.c_set.Union(u, v)
+
+    def union_edges(self, const Node[::1] src, const Node[::1] dst):
+        """Unions the endpoints of every edge of the contiguous int32 src and dst arrays, without holding the GIL."""
+        if src.shape[0] != dst.shape[0]:
+            raise ValueError("src and dst must have the same length")
+        if src.shape[0] == 0:
+            return
+        with nogil:
+            self.c_set.UnionEdges(&src[0], &dst[0], src.shape[0])
+
+    def labels(self):
+        """Returns the int32 component of every node, numbered in the order of their smallest node."""
+        labels = np.empty(self.c_set.size(), dtype=np.int32)
+        cdef Node[::1] l = labels
+        if self.c_set.size() > 0:
+            with nogil:
+                self.c_set.Labels(&l[0])
+        return labels
+
+    def clusters(self):
+        """Returns the components in CSR form: the members of component c are members[offsets[c]:offsets[c+1]], in increasing order."""
+        labels = self.labels()
+        offsets = np.zeros(self.c_set.num_components() + 1, dtype=np.int64)
+        np.cumsum(np.bincount(labels, minlength=self.c_set.num_components()), out=offsets[1:])
+        members = np.argsort(labels, kind='stable').astype(np.int32)
+        return offsets, members
+
+def contract_graph(const Node[::1] src, const Node[::1] dst, const double[::1] weight, const Node[::1] labels, size_t num_clusters):
+    """Contracts every node u into the super node labels[u] and returns the coarse int32 src, dst and float64 weight arrays.
+
+    Edges inside a super node are dropped and parallel edges are merged by summing their weights,
+    every coarse edge is listed once with src < dst.
+    """
+    if src.shape[0] != dst.shape[0] or src.shape[0] != weight.shape[0]:
+        raise ValueError("src, dst and weight must have the same length")
+    cdef EdgeArrays coarse
+    cdef const Node * src_ptr = &src[0] if src.shape[0] > 0 else NULL
+    cdef const Node * dst_ptr = &dst[0] if dst.shape[0] > 0 else NULL
+    cdef const double * weight_ptr = &weight[0] if weight.shape[0] > 0 else NULL
+    cdef const Node * labels_ptr = &labels[0] if labels.shape[0] > 0 else NULL
+    with nogil:
+        coarse = ContractGraph(src_ptr, dst_ptr, weight_ptr, src.shape[0], labels_ptr, labels.shape[0], num_clusters)
+
+    cdef size_t num_edges = coarse.src.size(), i
+    coarse_src = np.empty(num_edges, dtype=np.int32)
+    coarse_dst = np.empty(num_edges, dtype=np.int32)
+    coarse_weight = np.empty(num_edges, dtype=np.float64)
+    cdef Node[::1] s = coarse_src
+    cdef Node[::1] d = coarse_dst
+    cdef double[::1] w = coarse_weight
+    with nogil:
+        for i in range(num_edges):
+            s[i], d[i], w[i] = coarse.src[i], coarse.dst[i], coarse.weight[i]
+    return coarse_src, coarse_dst, coarse_weight
+
+def window_sampling(const Node[:, ::1] sequences, size_t window_size, double down_sampling, bool shuffle):
+    """Returns the (center, context) pairs of the walks as a (num_pairs, 2) int32 array."""
+    cdef NodeList samples
+    if sequences.shape[0] == 0:
+        return np.empty((0, 2), dtype=np.int32)
+    with nogil:
+        samples = WindowSampling(&sequences[0, 0], sequences.shape[0], sequences.shape[1], window_size, down_sampling, shuffle)
+    return as_node_matrix(samples, 2)
+
+def skip_sampling(const Node[:, ::1] sequences, size_t distance, double down_sampling, bool shuffle):
+    """Returns the pairs of nodes `distance` apart in the walks as a (num_pairs, 2) int32 array."""
+    cdef NodeList samples
+    if sequences.shape[0] == 0:
+        return np.empty((0, 2), dtype=np.int32)
+    with nogil:
+        samples = SkipSampling(&sequences[0, 0], sequences.shape[0], sequences.shape[1], distance, down_sampling, shuffle)
+    return as_node_matrix(samples, 2)
+
+def train_skip_gram(const Node[:, ::1] sequences, float[:, ::1] embeddings, float[:, ::1] contexts, size_t window_size, size_t neg_ratio, double neg_power, double down_sampling, double learning_rate, size_t num_threads):
+    """Runs one Hogwild skip-gram negative sampling epoch over the walks, updating the float32 embeddings and contexts in place."""
+    if embeddings.shape[0] != contexts.shape[0] or embeddings.shape[1] != contexts.shape[1]:
+        raise ValueError("embeddings and contexts must have the same shape")
+    if sequences.shape[0] == 0 or embeddings.shape[0] == 0 or embeddings.shape[1] == 0:
+        return
+    with nogil:
+        TrainSkipGram(&sequences[0, 0], sequences.shape[0], sequences.shape[1], &embeddings[0, 0], &contexts[0, 0],
+                      embeddings.shape[0], embeddings.shape[1], window_size, neg_ratio, neg_power, down_sampling, learning_rate, num_threads)
+
+def aco_walk(Graph graph, size_t num_walks, size_t max_step, size_t num_iterations, double alpha, double evaporate, size_t num_threads):
+    """Runs ACWalk and returns its pheromone per edge as int32 src, dst and float64 weight arrays.
+
+    Both directions of every edge are listed, self loops once.
+    """
+    print("\tStart executing Algorithm 2 - ACWalk ..\n")
+    cdef CCSRGraph g
+    with nogil:
+        g = ACOWalk(graph.c_graph, num_walks, max_step, num_iterations, alpha, evaporate, num_threads)
+
+    if g.number_of_edges() == 0:
         print("No edges found in graph.\n")
-        return []
 
-    phe = [(u, v, g.weight(u, v)) for u, v in edge_list]
+    cdef size_t edge_id, num_rows = 0
+    cdef pair[int, int] edge
+    for edge_id in range(g.number_of_edges()):
+        edge = g.edge(edge_id)
+        num_rows += 1 if edge.first == edge.second else 2
+
+    src = np.empty(num_rows, dtype=np.int32)
+    dst = np.empty(num_rows, dtype=np.int32)
+    weight = np.empty(num_rows, dtype=np.float64)
+    cdef int[::1] s = src
+    cdef int[::1] d = dst
+    cdef double[::1] w = weight
+    cdef size_t row = 0
+    with nogil:
+        for edge_id in range(g.number_of_edges()):
+            edge = g.edge(edge_id)
+            s[row], d[row], w[row] = edge.first, edge.second, g.weight(edge_id)
+            row += 1
+            if edge.first != edge.second:
+                s[row], d[row], w[row] = edge.second, edge.first, g.weight(edge_id)
+                row += 1
 
-    return phe
\ No newline at end of file
+    return src, dst, weight
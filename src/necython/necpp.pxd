@@ -3,6 +3,7 @@ from libcpp.vector cimport vector
 from libcpp.utility cimport pair
 from libcpp.unordered_set cimport unordered_set
 from libcpp.unordered_map cimport unordered_map
+from libc.stdint cimport uint32_t
 
 cdef extern from "cpp/graph.hpp" namespace "network_embedding" nogil:
     ctypedef int Node
@@ -76,24 +77,80 @@ cdef extern from "cpp/graph.hpp" namespace "network_embedding" nogil:
         size_t number_of_edges()
         size_t degree(const Node& u)
 
+    cdef cppclass CSRGraph:
+        CSRGraph() except +
+        CSRGraph(const Graph & graph) except +
+        const NodeList & nodes()
+        size_t number_of_nodes()
+        size_t number_of_edges()
+        const Edge & edge(size_t edge_id)
+        double weight(size_t edge_id)
+        void SetEdgeWeight(size_t edge_id, double weight)
+        size_t FindEdge(const Node& u, const Node& v) except +
+
+cdef extern from "cpp/alias.hpp" namespace "network_embedding" nogil:
+    cdef cppclass AliasTables:
+        AliasTables() except +
+        size_t size()
+        double probability(size_t i)
+        uint32_t alias(size_t i)
+        void Resize(size_t size) except +
+        void Build(size_t begin, size_t end, const double * weights) except +
+
+cdef extern from "cpp/disjoint_set.hpp" namespace "network_embedding" nogil:
+    cdef cppclass DisjointSet:
+        DisjointSet() except +
+        DisjointSet(size_t size) except +
+        size_t size()
+        size_t num_components()
+        Node Find(Node u) except +
+        bool Union(Node u, Node v) except +
+        void UnionEdges(const Node * src, const Node * dst, size_t num_edges) except +
+        void Labels(Node * labels) except +
+
+cdef extern from "cpp/coarsening.hpp" namespace "network_embedding" nogil:
+    cdef cppclass EdgeArrays:
+        NodeList src
+        NodeList dst
+        vector[double] weight
+    EdgeArrays ContractGraph(const Node * src, const Node * dst, const double * weight, size_t num_edges, const Node * labels, size_t num_nodes, size_t num_clusters) except +
+
+cdef extern from "cpp/common.hpp" namespace "network_embedding" nogil:
+    void SetRandomSeed(unsigned int seed)
+
 cdef extern from "cpp/walker.hpp" namespace "network_embedding" nogil:
     cdef cppclass Walker:
         Walker() except +
         void set_node_list(const NodeList& nodes)
         void SetTransitionWeights(const Node& node, const NodeList& neighbors, const vector[double]& weights)
-        void InitDistributionsFromGraph(const Graph& graph, bint weighted)
-        NodeList SimulateWalk(const Node& start_node, size_t walk_length)
-        vector[NodeList] Walk(size_t num_walks, size_t walk_length, size_t num_threads)
+        void InitDistributionsFromGraph(const Graph& graph, bint weighted) except +
+        NodeList SimulateWalk(const Node& start_node, size_t walk_length) except +
+        NodeList Walk(size_t num_walks, size_t walk_length, size_t num_threads) except +
+        NodeList WalkRange(size_t begin, size_t end, size_t num_walks, size_t walk_length, size_t num_threads) except +
+        const NodeList & get_node_list()
     
     cdef cppclass BiasedWalker:
         BiasedWalker() except +
-        void InitDistributionsFromGraph(const Graph& graph, double p, double q)
-        NodeList SimulateWalk(const Node& start_node, size_t walk_length)
-        vector[NodeList] Walk(size_t num_walks, size_t walk_length, size_t num_threads)
+        void InitDistributionsFromGraph(const Graph& graph, double p, double q) except +
+        NodeList SimulateWalk(const Node& start_node, size_t walk_length) except +
+        NodeList Walk(size_t num_walks, size_t walk_length, size_t num_threads) except +
+        NodeList WalkRange(size_t begin, size_t end, size_t num_walks, size_t walk_length, size_t num_threads) except +
+        const NodeList & get_node_list()
+
+    cdef cppclass RejectionBiasedWalker:
+        RejectionBiasedWalker() except +
+        void InitDistributionsFromGraph(const Graph& graph, double p, double q) except +
+        NodeList SimulateWalk(const Node& start_node, size_t walk_length) except +
+        NodeList Walk(size_t num_walks, size_t walk_length, size_t num_threads) except +
+        NodeList WalkRange(size_t begin, size_t end, size_t num_walks, size_t walk_length, size_t num_threads) except +
+        const NodeList & get_node_list()
 
 cdef extern from "cpp/sampling.hpp" namespace "network_embedding" nogil:
-    vector[NodeList] WindowSampling(const vector[NodeList] & sequences, size_t window_size, double down_sampling, bool shuffle);
-    vector[NodeList] SkipSampling(const vector[NodeList] & sequences, size_t distance, double down_sampling, bool shuffle);
+    NodeList WindowSampling(const Node * sequences, size_t num_sequences, size_t length, size_t window_size, double down_sampling, bool shuffle) except +
+    NodeList SkipSampling(const Node * sequences, size_t num_sequences, size_t length, size_t distance, double down_sampling, bool shuffle) except +
+
+cdef extern from "cpp/sgns.hpp" namespace "network_embedding" nogil:
+    void TrainSkipGram(const Node * sequences, size_t num_sequences, size_t length, float * embeddings, float * contexts, size_t num_nodes, size_t dimension, size_t window_size, size_t neg_ratio, double neg_power, double down_sampling, double learning_rate, size_t num_threads) except +
 
 cdef extern from "cpp/aco.hpp" namespace "network_embedding" nogil:
-    Graph ACOWalk(const Graph & graph, size_t num_walks, size_t max_step, size_t num_iterations, double alpha, double evaporate, size_t num_threads)
\ No newline at end of file
+    CSRGraph ACOWalk(const Graph & graph, size_t num_walks, size_t max_step, size_t num_iterations, double alpha, double evaporate, size_t num_threads) except +
\ No newline at end of file
@@ -1,17 +1,19 @@
 #coding:utf-8
 
 import numpy as np
-import networkx as nx
 from .base import BaseCoarsening
 from util.data_structure import DisjoinSet
 from util.stackoverflow import find_best_trade_off
 from necython import Graph as CGraph, aco_walk
+from netorch.models.walkbased.walker import CPU_COUNT
 
 
 class ACOCoarsening(BaseCoarsening):
 
-    def __init__(self, graph, threshold=0.2, window_size=10, num_walks=10, walk_length=80, phe_power=1., evapo_rate=0., iterations=1):
+    def __init__(self, graph, threshold=0.2, window_size=10, num_walks=10, walk_length=80, phe_power=1., evapo_rate=0., iterations=1, num_threads=min(20, CPU_COUNT)):
         super().__init__(graph, threshold)
+        # Threads of the ACO walks and pheromone deposits, each deposit thread keeps its own per-edge buffer
+        self.num_threads = num_threads
         self.window_size = window_size
         self.num_walks = num_walks
         self.walk_length = walk_length
@@ -19,19 +21,18 @@ class ACOCoarsening(BaseCoarsening):
         self.evapo_rate = evapo_rate
         self.iterations = iterations
 
-    def merge(self, graph):
-        m_graph = CGraph.from_nx_graph(graph)
-        edge_and_weights = aco_walk(m_graph, self.num_walks, self.window_size, self.iterations, self.phe_power, self.evapo_rate, 20) # LINE 4 AT ALGORITHM 4 = ACWALK ALGORITHM 2
+    def merge(self, num_nodes, src, dst, weight):
+        m_graph = CGraph.from_arrays(src, dst, weight)
+        edge_src, edge_dst, weights = aco_walk(m_graph, self.num_walks, self.window_size, self.iterations, self.phe_power, self.evapo_rate, self.num_threads) # LINE 4 AT ALGORITHM 4 = ACWALK ALGORITHM 2
         ########### START ALGORITHM 3 ###############
         print("\tStart executing Algorithm 3 - ATS ..\n")
-        edge_and_weights.sort(key=lambda item: item[2], reverse=True)  # SORT THE WEIGHTS IN DESCENDING ORDER = LINE 5 AT ALGORITHM 4
-
-        weights = np.array([item[2] for item in edge_and_weights])
-        trade_off_index = find_best_trade_off(weights)
+        # SORT THE WEIGHTS IN DESCENDING ORDER = LINE 5 AT ALGORITHM 4, ties keep the edge order like the stable list sort
+        order = np.argsort(-weights, kind='stable')
+        trade_off_index = find_best_trade_off(weights[order])
         ########### END ALGORITHM 3 ###############
 
-        ds = DisjoinSet(graph.number_of_nodes())
-        for u, v, weight in edge_and_weights[:trade_off_index+1]:
-            ds.union(u, v)
+        top = order[:trade_off_index+1]
+        ds = DisjoinSet(num_nodes)
+        ds.union_edges(edge_src[top], edge_dst[top])
 
-        return ds.make_mapping()
\ No newline at end of file
+        return ds.labels()
@@ -1,94 +1,104 @@
 # coding:utf-8
 import numpy as np
 import networkx as nx
-import pprint
-from scipy.sparse import coo_matrix
+
+from necython import contract_graph
+
+
+def clusters_from_labels(labels, num_clusters):
+    '''
+    RETURN the list of list of nodes of every cluster of an int label vector, nodes in increasing order
+    '''
+    members = np.argsort(labels, kind='stable')
+    offsets = np.zeros(num_clusters + 1, dtype=np.int64)
+    np.cumsum(np.bincount(labels, minlength=num_clusters), out=offsets[1:])
+    return [members[begin:end].tolist() for begin, end in zip(offsets[:-1], offsets[1:])]
 
 
 class BaseCoarsening(object):
 
     def __init__(self, graph, threshold=0.2, weighted=True):
-        nx.set_node_attributes(graph, 1, 'size')
         self.original_graph = graph
-        self.graphs = [graph]
-        self.mappings = [{node: [node] for node in graph.nodes}]
         self.threshold = threshold
         self.weighted = weighted
+        # Every level of the pyramid is kept as arrays: its number of nodes, its edges as int32 src, dst
+        # and float64 weight arrays and the number of original nodes in each of its nodes
+        num_nodes, num_edges = graph.number_of_nodes(), graph.number_of_edges()
+        self.num_nodes = [num_nodes]
+        self.edges = [(
+            np.fromiter((u for u, _ in graph.edges), dtype=np.int32, count=num_edges),
+            np.fromiter((v for _, v in graph.edges), dtype=np.int32, count=num_edges),
+            np.fromiter((w for _, _, w in graph.edges(data='weight', default=1.0)), dtype=np.float64, count=num_edges),
+        )]
+        self.sizes = [np.ones(num_nodes, dtype=np.int64)]
+        # One int32 vector per level, mapping every original node to its super node in that level
+        self.mappings = [np.arange(num_nodes, dtype=np.int32)]
+        self.nx_graphs = {0: graph}
 
-    def merge(self, graph):
+    @property
+    def graphs(self):
+        return [self.graph(level) for level in range(len(self.num_nodes))]
+
+    def graph(self, level):
         '''
-        RETURN merge result list of list
-        example [
-            [node1, node2],
-            [node3, node4, node5],
-            ...
-        ]
+        RETURN the networkx graph of a level, built from its arrays on first use
+        '''
+        if level not in self.nx_graphs:
+            src, dst, weight = self.edges[level]
+            graph = nx.Graph()
+            graph.add_nodes_from(range(self.num_nodes[level]))
+            graph.add_weighted_edges_from(zip(src.tolist(), dst.tolist(), weight.tolist()))
+            nx.set_node_attributes(graph, dict(enumerate(self.sizes[level].tolist())), 'size')
+            self.nx_graphs[level] = graph
+        return self.nx_graphs[level]
+
+    def merge(self, num_nodes, src, dst, weight):
+        '''
+        RETURN int32 label vector of the super node of every node, super nodes are numbered 0..k-1
+        example [0, 0, 1, 1, 1, 2, ...] merges [node0, node1], [node2, node3, node4], [node5], ...
         '''
         raise NotImplementedError
 
     def make_mappings_to_original_graph(self):
-        mappings_orig = [self.mappings[0]]
-        for mapping in self.mappings[1:]:
-            mappings_orig.append(self.extend_mapping(mappings_orig[-1], mapping))
-        return mappings_orig
-
-    def reverse_mapping(self, mapping):
-        return {node: super_node for super_node, nodes in mapping.items() for node in nodes}
-
-    def merge_result_to_mapping(self, merge_result):
-        return dict(enumerate(merge_result))
+        '''
+        RETURN the mapping of every level as a dict of super node -> list of original nodes, built on demand
+        '''
+        return [dict(enumerate(clusters_from_labels(mapping, num_nodes))) for mapping, num_nodes in zip(self.mappings, self.num_nodes)]
 
-    def extend_mapping(self, mapping_last, mapping_current):
-        extended_mapping = {super_node: [] for super_node in mapping_current}
-        for super_node, nodes in mapping_current.items():
-            for node in nodes:
-                extended_mapping[super_node].extend(mapping_last[node])
-        return extended_mapping
+    def projection(self, fine_level, coarse_level):
+        '''
+        RETURN int32 vector of the super node in coarse_level of every node of fine_level (fine_level <= coarse_level)
+        '''
+        projection = np.empty(self.num_nodes[fine_level], dtype=np.int32)
+        projection[self.mappings[fine_level]] = self.mappings[coarse_level]
+        return projection
 
-    def gen_merged_graph(self, graph, merge_result):
-        rev_mapping = {node: super_node for super_node, nodes in enumerate(merge_result) for node in nodes}
-        num_new_nodes = len(merge_result)
-        rows, cols, vals = [], [], []
-        for u, v in graph.edges:
-            su = rev_mapping[u]
-            sv = rev_mapping[v]
-            if su == sv:
-                continue
-            w = graph[u][v]['weight']
-            rows.append(su)
-            cols.append(sv)
-            rows.append(sv)
-            cols.append(su)
-            vals.append(w)
-            vals.append(w)
-        new_graph = nx.from_scipy_sparse_array(
-            coo_matrix(
-                (vals, (rows, cols)),
-                shape=(num_new_nodes, num_new_nodes),
-            ).tocsr()
-        )
+    def contract(self, level, labels, num_clusters):
+        '''
+        RETURN the edge arrays and node sizes of the level merged by labels
+        '''
+        src, dst, weight = contract_graph(*self.edges[level], labels, num_clusters)
         if not self.weighted:
-            nx.set_edge_attributes(new_graph, 1.0, 'weight')
-
-        for super_node, nodes in enumerate(merge_result):
-            sum_size = np.sum([graph.nodes[node]['size'] for node in nodes])
-            new_graph.nodes[super_node]['size'] = sum_size
-
-        return new_graph
+            weight = np.ones_like(weight)
+        sizes = np.bincount(labels, weights=self.sizes[level], minlength=num_clusters).astype(np.int64)
+        return (src, dst, weight), sizes
 
     ########### START ALGORITHM 4 ############
     def recursive_merge(self):
         print("\tStart executing Algorithm 4 - Coarsening ..\n")
-        edge_threshold = self.original_graph.number_of_edges() * self.threshold
-        node_threshold = self.original_graph.number_of_nodes() * self.threshold
+        edge_threshold = len(self.edges[0][0]) * self.threshold
+        node_threshold = self.num_nodes[0] * self.threshold
         while True:
-            cur_graph = self.graphs[-1]
-            merge_result = self.merge(cur_graph)  # LINE 4 + 5 , 3.1,3.2 in our book
-            if len(merge_result) == cur_graph.number_of_nodes():  # no edge in the graph
+            num_nodes = self.num_nodes[-1]
+            labels = self.merge(num_nodes, *self.edges[-1])  # LINE 4 + 5 , 3.1,3.2 in our book
+            num_clusters = int(labels.max()) + 1 if num_nodes > 0 else 0
+            if num_clusters == num_nodes:  # no edge in the graph
                 break
-            new_graph = self.gen_merged_graph(cur_graph, merge_result)  # LINE 6 AT ALGORITHM 4
-            self.graphs.append(new_graph)
-            self.mappings.append(self.merge_result_to_mapping(merge_result))
-            if new_graph.number_of_nodes() < node_threshold or new_graph.number_of_edges() < edge_threshold:
+            edges, sizes = self.contract(len(self.num_nodes) - 1, labels, num_clusters)  # LINE 6 AT ALGORITHM 4
+            self.num_nodes.append(num_clusters)
+            self.edges.append(edges)
+            self.sizes.append(sizes)
+            self.mappings.append(labels[self.mappings[-1]])
+            if num_clusters < node_threshold or len(edges[0]) < edge_threshold:
                 break
     ########### END ALGORITHM 4 ############
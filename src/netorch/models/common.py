@@ -1,20 +1,27 @@
 #coding:utf-8
 from math import sqrt
+import numpy as np
 import torch
 import torch.nn as nn
 import torch.optim as optim
 
+from necython import train_skip_gram
+
 class SkipGramNS(nn.Module):
-    def __init__(self, num_nodes, dimension, device='cuda:0'):
+    def __init__(self, num_nodes, dimension, device='cuda:0', sparse=False, generator=None):
         super().__init__()
         self.num_nodes = num_nodes
         self.dimension = dimension
         self.device = torch.device(device if torch.cuda.is_available() else 'cpu')
 
-        self.embeddings = nn.Embedding(self.num_nodes, self.dimension).to(self.device)
-        self.embeddings.weight.data.normal_(0.0, 1./sqrt(dimension))
-        self.contexts = nn.Embedding(self.num_nodes, self.dimension).to(self.device)
-        self.contexts.weight.data.normal_(0.0, 1./sqrt(dimension))
+        # Sparse embeddings only produce gradients for the rows of the batch. The weights are drawn on the
+        # CPU, from generator when one is given instead of the global torch generator, and then moved
+        self.embeddings = nn.Embedding(self.num_nodes, self.dimension, sparse=sparse)
+        self.embeddings.weight.data.normal_(0.0, 1./sqrt(dimension), generator=generator)
+        self.embeddings.to(self.device)
+        self.contexts = nn.Embedding(self.num_nodes, self.dimension, sparse=sparse)
+        self.contexts.weight.data.normal_(0.0, 1./sqrt(dimension), generator=generator)
+        self.contexts.to(self.device)
 
     def forward(self, u, v, sign):
         emb_u = self.embeddings(u)
@@ -26,16 +33,20 @@ class SkipGramNS(nn.Module):
         return loss
 
 class TripletEmbedding(nn.Module):
-    def __init__(self, num_nodes, dimension, device='cuda:0'):
+    def __init__(self, num_nodes, dimension, device='cuda:0', sparse=False, generator=None):
         super().__init__()
         self.num_nodes = num_nodes
         self.dimension = dimension
         self.device = torch.device(device if torch.cuda.is_available() else 'cpu')
 
-        self.embeddings = nn.Embedding(self.num_nodes, self.dimension).to(self.device)
-        self.embeddings.weight.data.normal_(0.0, 1./sqrt(dimension))
-        self.contexts = nn.Embedding(self.num_nodes, self.dimension).to(self.device)
-        self.contexts.weight.data.normal_(0.0, 1./sqrt(dimension))
+        # Sparse embeddings only produce gradients for the rows of the batch. The weights are drawn on the
+        # CPU, from generator when one is given instead of the global torch generator, and then moved
+        self.embeddings = nn.Embedding(self.num_nodes, self.dimension, sparse=sparse)
+        self.embeddings.weight.data.normal_(0.0, 1./sqrt(dimension), generator=generator)
+        self.embeddings.to(self.device)
+        self.contexts = nn.Embedding(self.num_nodes, self.dimension, sparse=sparse)
+        self.contexts.weight.data.normal_(0.0, 1./sqrt(dimension), generator=generator)
+        self.contexts.to(self.device)
 
     def forward(self, u, v, w):
         emb_u = self.embeddings(u)
@@ -53,6 +64,30 @@ class ModelIterator(object):
         self.model = model
         self.optimizer = optimizer
         self.scheduler = scheduler
+        self.buffers = {}
+
+    def as_tensor(self, name, values, dtype):
+        """
+        Copies a batch of values into a buffer reused across feed calls and returns it on the model device.
+
+        The buffer only grows when a larger batch comes in, and is pinned when the model lives on a GPU.
+
+        Args:
+            name (str): Name of the buffer to reuse.
+            values (np.ndarray): The batch values, of any numeric dtype and stride.
+            dtype (torch.dtype): The dtype of the returned tensor.
+
+        Returns:
+            torch.Tensor: The values as a 1-D tensor on the model device.
+        """
+        values = torch.from_numpy(np.asarray(values))
+        buffer = self.buffers.get(name)
+        if buffer is None or buffer.numel() < values.numel() or buffer.dtype != dtype:
+            buffer = torch.empty(values.numel(), dtype=dtype, pin_memory=self.model.device.type == 'cuda')
+            self.buffers[name] = buffer
+        tensor = buffer[:values.numel()]
+        tensor.copy_(values)
+        return tensor.to(self.model.device)
 
     def lr_decay(self):
         self.scheduler.step()
@@ -71,34 +106,66 @@ class ModelIterator(object):
 
 class NodeEmbedding(ModelIterator):
 
-    def __init__(self, num_nodes, dimension, learning_rate, device='cuda:0'):
-        model = SkipGramNS(num_nodes, dimension, device=torch.device(device if torch.cuda.is_available() else 'cpu'))
+    def __init__(self, num_nodes, dimension, learning_rate, device='cuda:0', sparse=False, generator=None):
+        model = SkipGramNS(num_nodes, dimension, device=torch.device(device if torch.cuda.is_available() else 'cpu'), sparse=sparse, generator=generator)
+        # Plain SGD applies sparse gradients to the rows of the batch only
         optimizer = optim.SGD(model.parameters(), lr=learning_rate)
         scheduler = optim.lr_scheduler.StepLR(optimizer, 1, gamma=0.9)
         super().__init__(model, optimizer, scheduler)
     
     def feed(self, u, v, sign):
         self.optimizer.zero_grad()
-        tu = torch.tensor(u, device=self.model.device, dtype=torch.long)
-        tv = torch.tensor(v, device=self.model.device, dtype=torch.long)
-        tsign = torch.tensor(sign, device=self.model.device, dtype=torch.float)
+        tu = self.as_tensor('u', u, torch.long)
+        tv = self.as_tensor('v', v, torch.long)
+        tsign = self.as_tensor('sign', sign, torch.float)
         loss = self.model(tu, tv, tsign)
         loss.backward()
         self.optimizer.step()
 
 class TripletNodeEmbedding(ModelIterator):
 
-    def __init__(self, num_nodes, dimension, learning_rate, device='cuda:0'):
-        model = TripletEmbedding(num_nodes, dimension, device=torch.device(device if torch.cuda.is_available() else 'cpu'))
+    def __init__(self, num_nodes, dimension, learning_rate, device='cuda:0', sparse=False, generator=None):
+        model = TripletEmbedding(num_nodes, dimension, device=torch.device(device if torch.cuda.is_available() else 'cpu'), sparse=sparse, generator=generator)
+        # Plain SGD applies sparse gradients to the rows of the batch only
         optimizer = optim.SGD(model.parameters(), lr=learning_rate)
         scheduler = optim.lr_scheduler.StepLR(optimizer, 1, gamma=0.9)
         super().__init__(model, optimizer, scheduler)
 
     def feed(self, u, v, w):
         self.optimizer.zero_grad()
-        tu = torch.tensor(u, device=self.model.device, dtype=torch.long)
-        tv = torch.tensor(v, device=self.model.device, dtype=torch.long)
-        tw = torch.tensor(w, device=self.model.device, dtype=torch.long)
+        tu = self.as_tensor('u', u, torch.long)
+        tv = self.as_tensor('v', v, torch.long)
+        tw = self.as_tensor('w', w, torch.long)
         loss = self.model(tu, tv, tw)
         loss.backward()
-        self.optimizer.step()
\ No newline at end of file
+        self.optimizer.step()
+
+class NativeNodeEmbedding(object):
+    """Skip-gram negative sampling model kept in float32 numpy arrays and trained by the necython Hogwild trainer."""
+
+    def __init__(self, num_nodes, dimension, learning_rate, gamma=0.9, random_state=None):
+        self.num_nodes = num_nodes
+        self.dimension = dimension
+        self.learning_rate = learning_rate
+        self.gamma = gamma
+        random_state = np.random if random_state is None else random_state
+        self.embeddings = random_state.normal(0.0, 1./sqrt(dimension), (num_nodes, dimension)).astype(np.float32)
+        self.contexts = random_state.normal(0.0, 1./sqrt(dimension), (num_nodes, dimension)).astype(np.float32)
+
+    def train(self, sequences, window_size, neg_ratio, neg_power, down_sampling, num_threads):
+        train_skip_gram(sequences, self.embeddings, self.contexts, window_size, neg_ratio, neg_power, down_sampling, self.learning_rate, num_threads)
+
+    def lr_decay(self):
+        self.learning_rate *= self.gamma
+
+    def get_embeddings(self):
+        return self.embeddings
+
+    def set_embeddings(self, emb):
+        np.copyto(self.embeddings, emb, casting='same_kind')
+
+    def get_contexts(self):
+        return self.contexts
+
+    def set_contexts(self, ctx):
+        np.copyto(self.contexts, ctx, casting='same_kind')
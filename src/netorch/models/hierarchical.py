@@ -1,18 +1,51 @@
 # coding:utf-8
+from concurrent.futures import ThreadPoolExecutor
+
 import numpy as np
+import torch
+from necython import set_random_seed
 
 from config import Config
+from netorch.models.walkbased.walker import CPU_COUNT
+
+
+def ThreadBudgets(sizes, num_workers, num_threads):
+    '''
+    Split num_threads cores between levels of the given sizes trained on num_workers workers.
+
+    The largest level gets most of the cores: its share of the total size, and at least half of them.
+    The other levels run num_workers-1 at a time next to it and split the rest evenly.
+
+    RETURN list of the number of threads of every level, at least 1 each
+    '''
+    if num_workers <= 1 or len(sizes) <= 1:
+        return [num_threads] * len(sizes)
+    other_workers = min(num_workers, len(sizes)) - 1
+    largest = int(np.argmax(sizes))
+    share = int(round(num_threads * sizes[largest] / max(sum(sizes), 1)))
+    finest_threads = max(1, min(num_threads - other_workers, max(share, (num_threads + 1) // 2)))
+    other_threads = max(1, (num_threads - finest_threads) // other_workers)
+    return [finest_threads if i == largest else other_threads for i in range(len(sizes))]
 
 
 class MLNE(object):
 
-    def __init__(self, graph, dimension, Model, Coarsening, num_scales):
+    def __init__(self, graph, dimension, Model, Coarsening, num_scales, num_workers=1, warm_start=False, warm_start_iterations=1, num_threads=CPU_COUNT):
         self.original_graph = graph
         self.dimension = dimension
         self.Model = Model
         self.Coarsening = Coarsening
         self.num_scales = num_scales
-        self.embeddings = np.zeros((graph.number_of_nodes(), 0))
+        # Number of pyramid levels trained at the same time, 1 trains them one after another. With more workers
+        # Model is called as Model(graph, dimension, num_threads=..., random_state=..., generator=...), so that
+        # the levels split num_threads cores and each level draws from its own numpy and torch random states
+        self.num_workers = num_workers
+        self.num_threads = num_threads
+        # Train the levels from coarse to fine, every level starting from the embeddings of the level above it
+        # projected through the pyramid, and trained for warm_start_iterations instead of the model's iterations
+        self.warm_start = warm_start
+        self.warm_start_iterations = warm_start_iterations
+        self.embeddings = np.zeros((graph.number_of_nodes(), 0), dtype=np.float32)
 
     # def dimension_reduction(self, embeddings, dimension):
     #     return PCA(n_components=dimension).fit_transform(embeddings)
@@ -24,22 +57,22 @@ class MLNE(object):
         coarsening = self.Coarsening(self.original_graph)
 
         # If only one graph is returned perform recursive merging
-        if len(coarsening.graphs) == 1:
+        if len(coarsening.num_nodes) == 1:
             coarsening.recursive_merge()
 
         print("\tFinish executing Algorithm 4 - Coarsening ..\n")
-        # Retrieve the list of coarsened graphs and their mappings to the original graph, keeps the order of supernodes
-        graphs = coarsening.graphs  # graph pyramid
-        mappings = coarsening.make_mappings_to_original_graph()
+        # Retrieve the sizes of the coarsened levels and their mappings to the original graph, keeps the order of supernodes
+        level_nodes = coarsening.num_nodes  # graph pyramid
+        mappings = coarsening.mappings  # original node -> super node vector of every level
 
         # Prepare to select significant levels of graph coarsening based on node reduction
         prev_nodes = None
         indices = []
-        for i, g in enumerate(graphs):
+        for i, num_nodes in enumerate(level_nodes):
             # Reducing the number of nodes by at least 3% compared to the previous graph is considered significant.
-            if prev_nodes is None or g.number_of_nodes() < prev_nodes * 0.97:
+            if prev_nodes is None or num_nodes < prev_nodes * 0.97:
                 indices.append(i)
-                prev_nodes = g.number_of_nodes()
+                prev_nodes = num_nodes
 
         # Determine the number of scales and select indices to use for training
         num_scales = min(len(indices), self.num_scales)
@@ -47,29 +80,68 @@ class MLNE(object):
         selected_indices = [int(np.ceil(i * step)) for i in range(num_scales)]
         selected_indices = [indices[i] for i in selected_indices]
 
-        # Get the graphs and mappings for the selected indices
-        train_graphs = [graphs[index] for index in selected_indices]
+        # Get the graphs and mappings for the selected indices, only these levels are turned into networkx graphs
+        train_graphs = [coarsening.graph(index) for index in selected_indices]
         train_mappings = [mappings[index] for index in selected_indices]
 
         # Set dimensions for each graph to be trained
         dimensions = [self.dimension for g in train_graphs]
 
         print("\tStart the embedding on each layer of the pyramid ..\n")
-        # Train embedding on each selected graph layer
-        for i, (graph, mapping, dimension) in enumerate(zip(train_graphs, train_mappings, dimensions)):
+        # The embedding matrix of all the scales is allocated once, every scale fills its own block of columns
+        self.embeddings = np.empty((self.original_graph.number_of_nodes(), sum(dimensions)), dtype=np.float32)
+        offsets = np.cumsum([0] + dimensions)
+
+        def train_level(i, seed=None, warm=None, num_threads=None):
+            graph, mapping, dimension = train_graphs[i], train_mappings[i], dimensions[i]
             print('\n\tTraining graph#{} #nodes={} #edges={}\n'.format(i, graph.number_of_nodes(), graph.number_of_edges()))
-            # Reverse the mapping for embedding assignment
-            rev_mapping = coarsening.reverse_mapping(mapping)
             # Initialize and train the embedding model
-            model = self.Model(graph, dimension)
+            if seed is None:
+                model = self.Model(graph, dimension)
+            else:
+                # The native generator is per thread, seed it for the walks of this level, and give the
+                # sampler and the weights their own states instead of the global ones shared by all the levels
+                set_random_seed(seed)
+                model = self.Model(graph, dimension,
+                                   num_threads=num_threads,
+                                   random_state=np.random.RandomState(seed),
+                                   generator=torch.Generator().manual_seed(seed))
+            if warm is not None:
+                # Start from the coarser level: every node takes the vectors of its super node there
+                coarse_model, projection = warm
+                model.set_embeddings(np.ascontiguousarray(coarse_model.get_embeddings()[projection]))
+                model.set_contexts(np.ascontiguousarray(coarse_model.get_contexts()[projection]))
+                model.iterations = self.warm_start_iterations
             results = model.train().get_embeddings()
-            # Initialize array to hold embeddings for the original graph's nodes, creating the embedding matrix
-            embeddings = np.ndarray(shape=(self.original_graph.number_of_nodes(), dimension))
-            # Assign embeddings from the model to the corresponding nodes in the original graph
-            for node, super_node in rev_mapping.items():
-                embeddings[node, :] = results[super_node, :]
-            # Concatenate new embeddings with existing embeddings, embedding matrix!
-            self.embeddings = np.concatenate([self.embeddings, embeddings], axis=1)
+            # Gather the embedding of every original node's super node into this scale's columns
+            self.embeddings[:, offsets[i]:offsets[i + 1]] = results[mapping]
+            return model
+
+        num_workers = min(self.num_workers, len(train_graphs))
+        if self.warm_start:
+            # Every level waits for the one above it, so the levels are trained one after another from the coarsest
+            warm = None
+            for i in reversed(range(len(train_graphs))):
+                model = train_level(i, warm=warm)
+                if i > 0 and dimensions[i - 1] == dimensions[i]:
+                    warm = (model, coarsening.projection(selected_indices[i - 1], selected_indices[i]))
+                else:
+                    warm = None
+        elif num_workers <= 1:
+            # Train embedding on each selected graph layer
+            for i in range(len(train_graphs)):
+                train_level(i)
+        else:
+            # The levels are independent: the finest level starts first with most of the cores,
+            # while the small coarse levels share the other workers and the rest of the cores
+            sizes = [g.number_of_edges() for g in train_graphs]
+            order = sorted(range(len(train_graphs)), key=lambda i: sizes[i], reverse=True)
+            budgets = ThreadBudgets(sizes, num_workers, self.num_threads)
+            seeds = np.random.randint(2**31, size=len(train_graphs))
+            with ThreadPoolExecutor(max_workers=num_workers) as pool:
+                futures = [pool.submit(train_level, i, int(seeds[i]), num_threads=budgets[i]) for i in order]
+                for future in futures:
+                    future.result()
 
         # self.embeddings = self.dimension_reduction(self.embeddings, self.dimension)
         print("\n\tFinish executing MLNE Algorithm ..\n")
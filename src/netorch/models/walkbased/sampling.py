@@ -1,43 +1,78 @@
 #coding:utf-8
-from collections import defaultdict, Counter
+import queue
+import threading
 import numpy as np
 from tqdm import tqdm
-from necython import window_sampling, skip_sampling
+from necython import window_sampling, skip_sampling, set_random_seed, alias_table
 from config import Config
 
 
+class AliasSampler(object):
+    """
+    Draws nodes from a fixed distribution in O(1) per draw with an alias table.
+
+    The table is built once per graph, and negatives are drawn batch by batch as they are needed.
+    """
+
+    def __init__(self, weights):
+        self.probabilities, self.aliases = alias_table(np.ascontiguousarray(weights, dtype=np.float64))
+
+    @classmethod
+    def from_sequences(cls, sequences, power=.75):
+        """Samples nodes proportionally to their walk counts raised to power."""
+        return cls(np.power(np.bincount(sequences.ravel()), power))
+
+    @classmethod
+    def from_degrees(cls, graph, power=.75):
+        """Samples nodes proportionally to their degrees raised to power, which walk counts converge to."""
+        weights = np.zeros(graph.number_of_nodes())
+        nodes, degrees = zip(*graph.degree())
+        weights[list(nodes)] = degrees
+        return cls(np.power(weights, power))
+
+    def __len__(self):
+        return len(self.probabilities)
+
+    def draw(self, size, random_state=np.random):
+        """
+        Draws size nodes.
+
+        Args:
+            size (int): Number of nodes to draw.
+            random_state (np.random.RandomState): Source of randomness, the global numpy state by default.
+
+        Returns:
+            np.ndarray: The drawn nodes.
+        """
+        columns = random_state.randint(0, len(self.probabilities), size=size)
+        keep = random_state.random_sample(size) < self.probabilities[columns]
+        return np.where(keep, columns, self.aliases[columns])
+
+
 class NegativeSampling(object):
 
-    def __init__(self, window_size, batch_size, neg_ratio=5, neg_power=.75, down_sampling=-1):
+    def __init__(self, window_size, batch_size, neg_ratio=5, neg_power=.75, down_sampling=-1, chunk_size=1024, queue_size=8, random_state=None):
         self.window_size = window_size
         self.batch_size = batch_size
         self.neg_ratio = neg_ratio
         self.neg_power = neg_power
         self.down_sampling = down_sampling
+        self.chunk_size = chunk_size
+        self.queue_size = queue_size
+        # Source of the negatives, the global numpy state unless the caller gives this sampler its own
+        self.random_state = np.random if random_state is None else random_state
         self.samples = None
-
-    def init_negative_probs(self, sequences):
-        counter = Counter()
-        for seq in sequences:
-            counter.update(seq)
-        weights = [counter[i] for i in range(len(counter))]
-        weights = np.power(weights, self.neg_power)
-        self.neg_probs = weights/np.sum(weights)
+        self.negatives = None
 
     def init_samples(self, sequences, shuffle=False):
-        self.init_negative_probs(sequences)
-        samples = window_sampling(sequences, self.window_size, self.down_sampling, shuffle)
-        samples = np.array(samples)
-        return samples
+        self.negatives = AliasSampler.from_sequences(sequences, self.neg_power)
+        return window_sampling(sequences, self.window_size, self.down_sampling, shuffle)
 
     def sample(self, sequences):
         if self.samples is None:
             self.samples = self.init_samples(sequences)
         samples = self.samples
         total_cnt = len(samples)
-        pos_cnt = self.batch_size//(self.neg_ratio+1)
-        neg_cnt = pos_cnt*self.neg_ratio
-        neg_samples = np.random.choice(len(self.neg_probs), size=total_cnt*self.neg_ratio, p=self.neg_probs)
 
         bar = tqdm(
             total=total_cnt * (self.neg_ratio + 1),
@@ -47,6 +82,26 @@ class NegativeSampling(object):
             ascii="  #",
         )
 
+        for batch in self.batches(samples, self.random_state):
+            yield batch
+            bar.update(len(batch[0]))
+
+        bar.close()
+
+    def batches(self, samples, random_state=np.random):
+        """
+        Splits positive pairs into training batches, each followed by the negative pairs of its centers.
+
+        Args:
+            samples (np.ndarray): (num_pairs, 2) positive (center, context) pairs.
+            random_state (np.random.RandomState): Source of the negatives, drawn batch by batch.
+
+        Yields:
+            tuple: The (u, v, sign) arrays of a batch, sign being 1 for positive and -1 for negative pairs.
+        """
+        total_cnt = len(samples)
+        pos_cnt = self.batch_size//(self.neg_ratio+1)
+
         start_idx = 0
         end_idx = min(start_idx+pos_cnt, total_cnt)
         while start_idx<end_idx:
@@ -57,46 +112,98 @@ class NegativeSampling(object):
             samp[:pos_cnt_2,:2] = samples[start_idx:end_idx,:]
             samp[:pos_cnt_2,2] = 1
             samp[pos_cnt_2:,0] = np.repeat(samp[:pos_cnt_2,0], self.neg_ratio)
-            samp[pos_cnt_2:,1] = neg_samples[start_idx*self.neg_ratio:end_idx*self.neg_ratio]
+            samp[pos_cnt_2:,1] = self.negatives.draw(neg_cnt_2, random_state)
             samp[pos_cnt_2:,2] = -1
             yield samp[:,0], samp[:,1], samp[:,2]
 
-            bar.update(pos_cnt_2*(self.neg_ratio+1))
-
             start_idx = end_idx
             end_idx = min(start_idx+pos_cnt, total_cnt)
 
-        bar.close()
+    def stream(self, walker, graph):
+        """
+        Streams training batches from walks generated on the fly, instead of materializing every pair up front.
+
+        A background thread walks the graph chunk by chunk, windows each chunk into pairs and queues the ready
+        batches, so training starts right away and at most queue_size batches are held in memory. Negatives are
+        drawn from the degree distribution, as the walk counts are not known before the walks are done.
+
+        Args:
+            walker (BaseWalker): The walker to generate the walks with.
+            graph (nx.Graph): The graph to walk on.
+
+        Yields:
+            tuple: The (u, v, sign) arrays of a batch, as `batches` does.
+        """
+        if self.negatives is None:
+            self.negatives = AliasSampler.from_degrees(graph, self.neg_power)
+        seed = self.random_state.randint(2**31)
+        batches = queue.Queue(maxsize=self.queue_size)
+        stop = threading.Event()
+        done = object()
+
+        def produce():
+            try:
+                set_random_seed(seed)
+                random_state = np.random.RandomState(seed)
+                for sequences in walker.walk_chunks(graph, self.chunk_size):
+                    samples = window_sampling(sequences, self.window_size, self.down_sampling, False)
+                    for batch in self.batches(samples, random_state):
+                        if stop.is_set():
+                            return
+                        batches.put(batch)
+            except Exception as e:
+                batches.put(e)
+            finally:
+                batches.put(done)
+
+        producer = threading.Thread(target=produce, daemon=True)
+        producer.start()
+
+        bar = tqdm(
+            file=Config.TQDM_WRITER,
+            mininterval=1.0,
+            desc="\n\tTraining:",
+            ascii="  #",
+        )
+        try:
+            while True:
+                batch = batches.get()
+                if batch is done:
+                    break
+                if isinstance(batch, Exception):
+                    raise batch
+                yield batch
+                bar.update(len(batch[0]))
+        finally:
+            # Unblock the producer if the consumer stopped early
+            stop.set()
+            while producer.is_alive():
+                try:
+                    batches.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            bar.close()
 
 class TripletSampling(object):
-    def __init__(self, window_size, batch_size, neg_power=.75, down_sampling=-1):
+    def __init__(self, window_size, batch_size, neg_power=.75, down_sampling=-1, random_state=None):
         self.window_size = window_size
         self.batch_size = batch_size
         self.neg_power = neg_power
         self.down_sampling = down_sampling
+        self.random_state = np.random if random_state is None else random_state
 
         self.samples = None
-
-    def init_negative_probs(self, sequences):
-        counter = Counter()
-        for seq in sequences:
-            counter.update(seq)
-        weights = [counter[i] for i in range(len(counter))]
-        weights = np.power(weights, self.neg_power)
-        self.neg_probs = weights/np.sum(weights)
+        self.negatives = None
 
     def init_samples(self, sequences, shuffle=False):
-        self.init_negative_probs(sequences)
-        samples = window_sampling(sequences, self.window_size, self.down_sampling, shuffle)
-        samples = np.array(samples)
-        return samples
+        self.negatives = AliasSampler.from_sequences(sequences, self.neg_power)
+        return window_sampling(sequences, self.window_size, self.down_sampling, shuffle)
 
     def sample(self, sequences):
         if self.samples is None:
             self.samples = self.init_samples(sequences)
         samples = self.samples
         total = len(samples)
-        neg_samples = np.random.choice(len(self.neg_probs), size=total, p=self.neg_probs)
 
         bar = tqdm(
             total=total,
@@ -112,7 +219,7 @@ class TripletSampling(object):
         while start_idx<end_idx:
             samp = np.ndarray((end_idx-start_idx, 3), dtype=np.int32)
             samp[:,:2] = samples[start_idx:end_idx,:]
-            samp[:,2] = neg_samples[start_idx:end_idx]
+            samp[:,2] = self.negatives.draw(end_idx-start_idx, self.random_state)
             yield samp[:,0], samp[:,1], samp[:,2]
 
             bar.update(end_idx-start_idx)
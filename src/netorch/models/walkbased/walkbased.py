@@ -6,13 +6,13 @@ import networkx as nx
 from sklearn.preprocessing import normalize
 
 from netorch.lookup import GraphLookup
-from netorch.models.common import NodeEmbedding
-from .sampling import NegativeSampling
-from .walker import Walker, BiasedWalker
+from netorch.models.common import NodeEmbedding, NativeNodeEmbedding, TripletNodeEmbedding
+from .sampling import NegativeSampling, TripletSampling
+from .walker import Walker, BiasedWalker, CPU_COUNT
 
 class WalkBasedEmbedding(object):
 
-    def __init__(self, graph, dimension, iterations, walker, sampler, model):
+    def __init__(self, graph, dimension, iterations, walker, sampler, model, streaming=False):
         self.graph = graph
         self.dimension = dimension
         self.iterations = iterations
@@ -20,8 +20,17 @@ class WalkBasedEmbedding(object):
         self.walker = walker
         self.sampler = sampler
         self.model = model
+        # Generate fresh walks every iteration and train on them as they come, see NegativeSampling.stream
+        self.streaming = streaming
 
     def train(self):
+        if self.streaming:
+            for it in range(self.iterations):
+                for samples in self.sampler.stream(self.walker, self.graph):
+                    self.model.feed(*samples)
+                self.model.lr_decay()
+            return self
+
         sequences = self.walker.walk(self.graph)
 
         for it in range(self.iterations):
@@ -43,6 +52,56 @@ class WalkBasedEmbedding(object):
     def get_contexts(self):
         return self.model.get_contexts()
 
+class NativeWalkBasedEmbedding(WalkBasedEmbedding):
+    """Walk based embedding trained by the native skip-gram trainer directly on the walk array."""
+
+    def __init__(self, graph, dimension, iterations, walker, model, window_size, neg_ratio=5, neg_power=.75, down_sampling=-1, num_threads=CPU_COUNT):
+        super().__init__(graph, dimension, iterations, walker, None, model)
+        self.window_size = window_size
+        self.neg_ratio = neg_ratio
+        self.neg_power = neg_power
+        self.down_sampling = down_sampling
+        self.num_threads = num_threads
+
+    def train(self):
+        sequences = self.walker.walk(self.graph)
+
+        for it in range(self.iterations):
+            self.model.train(sequences, self.window_size, self.neg_ratio, self.neg_power, self.down_sampling, self.num_threads)
+            self.model.lr_decay()
+
+        return self
+
+def WalkBasedModel(graph, dimension, iterations, walker, window_size, batch_size, neg_ratio, learning_rate, down_sample_threshold, streaming, backend, sparse=False, num_threads=CPU_COUNT, random_state=None, generator=None):
+    # num_threads bounds the native trainer, random_state (np.random.RandomState) and generator (torch.Generator)
+    # replace the global numpy and torch random states, so models trained side by side stay reproducible
+    if backend == 'native':
+        # The native trainer runs on the walk array with its own plain SGD updates
+        if streaming:
+            raise ValueError("streaming is only supported by the 'torch' backend")
+        if sparse:
+            raise ValueError("sparse is only supported by the 'torch' backend")
+        return NativeWalkBasedEmbedding(graph,
+            dimension,
+            iterations,
+            walker = walker,
+            model = NativeNodeEmbedding(graph.number_of_nodes(), dimension, learning_rate, random_state=random_state),
+            window_size = window_size,
+            neg_ratio = neg_ratio,
+            down_sampling = down_sample_threshold,
+            num_threads = num_threads,
+        )
+    if backend != 'torch':
+        raise ValueError("backend must be 'torch' or 'native', got {!r}".format(backend))
+    return WalkBasedEmbedding(graph,
+        dimension,
+        iterations,
+        walker = walker,
+        sampler = NegativeSampling(window_size, batch_size, neg_ratio=neg_ratio, down_sampling=down_sample_threshold, random_state=random_state),
+        model = NodeEmbedding(graph.number_of_nodes(), dimension, learning_rate, sparse=sparse, generator=generator),
+        streaming = streaming,
+    )
+
 def DeepWalk(graph, *,
         dimension = 128,
         num_walks = 10,
@@ -53,13 +112,28 @@ def DeepWalk(graph, *,
         learning_rate = 0.001,
         batch_size = 10000,
         down_sample_threshold = 1e-3,
-        weighted_walk=False):
-    return WalkBasedEmbedding(graph,
+        weighted_walk=False,
+        streaming=False,
+        backend='torch',
+        sparse=False,
+        num_threads=CPU_COUNT,
+        random_state=None,
+        generator=None):
+    return WalkBasedModel(graph,
         dimension,
         iterations,
-        walker = Walker(num_walks, walk_length, weighted=weighted_walk),
-        sampler = NegativeSampling(window_size, batch_size, neg_ratio=neg_ratio, down_sampling=down_sample_threshold),
-        model = NodeEmbedding(graph.number_of_nodes(), dimension, learning_rate),
+        walker = Walker(num_walks, walk_length, weighted=weighted_walk, multi_process=num_threads),
+        window_size = window_size,
+        batch_size = batch_size,
+        neg_ratio = neg_ratio,
+        learning_rate = learning_rate,
+        down_sample_threshold = down_sample_threshold,
+        streaming = streaming,
+        backend = backend,
+        sparse = sparse,
+        num_threads = num_threads,
+        random_state = random_state,
+        generator = generator,
     )
 
 def Node2Vec(graph, *, p, q,
@@ -71,13 +145,28 @@ def Node2Vec(graph, *, p, q,
         neg_ratio = 5,
         learning_rate = 0.001,
         batch_size = 10000,
-        down_sample_threshold = 1e-3):
-    return WalkBasedEmbedding(graph,
+        down_sample_threshold = 1e-3,
+        streaming = False,
+        backend = 'torch',
+        sparse = False,
+        num_threads = CPU_COUNT,
+        random_state = None,
+        generator = None):
+    return WalkBasedModel(graph,
         dimension,
         iterations,
-        walker = BiasedWalker(num_walks, walk_length, p=p, q=q),
-        sampler = NegativeSampling(window_size, batch_size, neg_ratio=neg_ratio, down_sampling=down_sample_threshold),
-        model = NodeEmbedding(graph.number_of_nodes(), dimension, learning_rate),
+        walker = BiasedWalker(num_walks, walk_length, p=p, q=q, multi_process=num_threads),
+        window_size = window_size,
+        batch_size = batch_size,
+        neg_ratio = neg_ratio,
+        learning_rate = learning_rate,
+        down_sample_threshold = down_sample_threshold,
+        streaming = streaming,
+        backend = backend,
+        sparse = sparse,
+        num_threads = num_threads,
+        random_state = random_state,
+        generator = generator,
     )
 
 def Triplet(graph,*,
@@ -88,12 +177,16 @@ def Triplet(graph,*,
         iterations = 3,
         learning_rate = 0.001,
         batch_size = 10000,
-        down_sample_threshold = 1e-3):
+        down_sample_threshold = 1e-3,
+        sparse = False,
+        num_threads = CPU_COUNT,
+        random_state = None,
+        generator = None):
     return WalkBasedEmbedding(graph,
         dimension,
         iterations,
-        walker = Walker(num_walks, walk_length),
-        sampler = TripletSampling(window_size, batch_size, down_sampling=down_sample_threshold),
-        model = TripletNodeEmbedding(graph.number_of_nodes(), dimension, learning_rate),
+        walker = Walker(num_walks, walk_length, multi_process=num_threads),
+        sampler = TripletSampling(window_size, batch_size, down_sampling=down_sample_threshold, random_state=random_state),
+        model = TripletNodeEmbedding(graph.number_of_nodes(), dimension, learning_rate, sparse=sparse, generator=generator),
     )
 
@@ -3,11 +3,39 @@ import multiprocessing as mp
 import numpy as np
 import networkx as nx
 
-from necython import Graph as CGraph, Walker as CWalker, BiasedWalker as CBiasedWalker
+from necython import Graph as CGraph, Walker as CWalker, BiasedWalker as CBiasedWalker, RejectionBiasedWalker as CRejectionBiasedWalker
 
 CPU_COUNT = mp.cpu_count()
+# Above this many bytes of second order transition tables, BiasedWalker falls back to rejection sampling
+TABLE_MEMORY_LIMIT = 1 << 30
 
-class Walker(object):
+class BaseWalker(object):
+
+    def native_walker(self, graph):
+        raise NotImplementedError
+
+    def walk(self, graph):
+        w = self.native_walker(graph)
+        sequences = w.walk(self.num_walks, self.walk_length, self.multi_process)
+        return sequences
+
+    def walk_chunks(self, graph, chunk_size):
+        """
+        Walks the graph in chunks of start nodes, so that only one chunk of walks is in memory at a time.
+
+        Args:
+            graph (nx.Graph): The graph to walk on.
+            chunk_size (int): Number of start nodes per chunk.
+
+        Yields:
+            np.ndarray: The (chunk_size*num_walks, walk_length+1) int32 walks of the next chunk.
+        """
+        w = self.native_walker(graph)
+        num_nodes = w.number_of_nodes()
+        for begin in range(0, num_nodes, chunk_size):
+            yield w.walk_range(begin, begin+chunk_size, self.num_walks, self.walk_length, self.multi_process)
+
+class Walker(BaseWalker):
 
     def __init__(self, num_walks=10, walk_length=80, weighted=False, multi_process=CPU_COUNT):
         self.num_walks = num_walks
@@ -15,25 +43,44 @@ class Walker(object):
         self.weighted = weighted
         self.multi_process = multi_process
 
-    def walk(self, graph):
+    def native_walker(self, graph):
         g = CGraph.from_nx_graph(graph)
         w = CWalker()
         w.init_distributions_from_graph(g, self.weighted)
-        sequences = w.walk(self.num_walks, self.walk_length, self.multi_process)
-        return sequences
+        return w
 
-class BiasedWalker(object):
+class BiasedWalker(BaseWalker):
 
-    def __init__(self, num_walks=10, walk_length=80, p=1., q=1., multi_process=CPU_COUNT):
+    def __init__(self, num_walks=10, walk_length=80, p=1., q=1., multi_process=CPU_COUNT, rejection=None, memory_limit=TABLE_MEMORY_LIMIT):
         self.num_walks = num_walks
         self.walk_length = walk_length
         self.p = p
         self.q = q
         self.multi_process = multi_process
+        self.rejection = rejection
+        self.memory_limit = memory_limit
 
-    def walk(self, graph):
+    def native_walker(self, graph):
         g = CGraph.from_nx_graph(graph)
-        w = CBiasedWalker()
+        rejection = self.rejection
+        if rejection is None:
+            rejection = self.table_memory(graph) > self.memory_limit
+        w = CRejectionBiasedWalker() if rejection else CBiasedWalker()
         w.init_distributions_from_graph(g, self.p, self.q)
-        sequences = w.walk(self.num_walks, self.walk_length, self.multi_process)
-        return sequences
+        return w
+
+    @staticmethod
+    def table_memory(graph):
+        """
+        Estimates the bytes taken by the per-edge transition tables of the native BiasedWalker.
+
+        Every directed edge (u, v) holds an alias table of deg(v)+1 entries (12 bytes each) plus an offset.
+
+        Args:
+            graph (nx.Graph): The graph to walk on.
+
+        Returns:
+            int: The estimated size of the tables in bytes.
+        """
+        degrees = np.fromiter((degree for _, degree in graph.degree()), dtype=np.int64, count=graph.number_of_nodes())
+        return int(np.sum(degrees * (degrees + 1)) * 12 + degrees.sum() * 8)
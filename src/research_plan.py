@@ -1,9 +1,18 @@
 # coding:utf-8
 import random
+import multiprocessing as mp
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import shared_memory
 import numpy as np
+import networkx as nx
+import torch
+from necython import set_random_seed
 from netorch.coarsening.aco import ACOCoarsening
 from netorch.models.walkbased import Node2Vec
 from netorch.models.hierarchical import MLNE
+from netorch.models.walkbased.walker import CPU_COUNT
+from scipy.sparse import csr_matrix, issparse
 from scipy.spatial.distance import cosine
 from scipy.special import expit  # Sigmoid function
 from config import Config
@@ -11,43 +20,327 @@ from config import Config
 
 class ResearchPlan:
 
-    def __init__(self, g, d, t1, t2, p, K):
+    def __init__(self, g, d, t1, t2, p, K, scoring="edges", num_workers=None, seed=None):
+        if scoring not in ("edges", "all_pairs"):
+            raise ValueError("Scoring must be either 'edges' or 'all_pairs'.")
         self.g = g
         self.d = d
         self.t1 = t1
         self.t2 = t2
         self.p = p
         self.K = K
+        self.scoring = scoring
+        self.num_workers = Config.RESEARCH_WORKERS if num_workers is None else num_workers
+        self.seed = Config.SEED if seed is None else seed
 
     def ResearchPlanAlg(self):
-        similarity_matrix_list = []
-
-        for i in range(self.K):
-            print(f"\nIteration number {i+1} of total {self.K} iterations:\n")
-            original_graph = self.g.copy()
-            print(f"\tRandomly remove {self.p}% of the graph's edges\n")
-            g_tag = RemoveEdges(original_graph, self.p)
-
-            # loads the model with the embedding method and coarsening method
-            model = MLNE(
-                graph=g_tag,
-                dimension=self.d,
-                Model=lambda graph, dimension: Node2Vec(graph, dimension=dimension, batch_size=Config.NODE2VEC_BATCH_SIZE, iterations=Config.NODE2VEC_ITERATIONS, p=Config.NODE2VEC_P, q=Config.NODE2VEC_Q),
-                Coarsening=lambda graph: ACOCoarsening(graph, phe_power=Config.ALPHA, iterations=Config.ACO_COARSENING_ITERATIONS),
-                num_scales=Config.PYRAMID_SCALES
-            )
-            # start the process and receive the embedding matrix
-            embedding_matrix = model.train().get_embeddings()
-            print("\tCalculating the similarity matrix based on threshold 1 ..\n")
-            similarity_matrix = CalculateCosineSimilarity(embedding_matrix, self.t1)
-            similarity_matrix_list.append(similarity_matrix)
+        CheckNodeLabels(self.g)
+        # RefineGraph only looks at the edges of the graph, so by default only those pairs are scored
+        edges = EdgeArray(self.g)
+        scored_edges = edges if self.scoring == "edges" else None
+        votes = VoteAccumulator(self.K, edges=scored_edges, num_nodes=self.g.number_of_nodes())
+        weights = np.array([weight for _, _, weight in self.g.edges(data='weight', default=1.0)], dtype=np.float64)
+        # Every iteration gets its own seed, so the votes do not depend on the order the iterations run in.
+        # The native walkers and trainer also depend on their thread count, which is fixed by num_workers
+        # (see IterationThreads), so the votes are reproducible for a given seed and number of workers
+        seeds = IterationSeeds(self.seed, self.K)
+        params = dict(d=self.d, t1=self.t1, p=self.p, K=self.K)
+
+        if self.num_workers > 1:
+            results = ParallelIterations(self.g.number_of_nodes(), edges, weights, scored_edges is not None, seeds, params, self.num_workers)
+            for similarity_matrix in results:
+                # fold the iteration into the vote counts right away instead of keeping its matrix
+                votes.add(similarity_matrix)
+        else:
+            # The graph is rebuilt from its arrays exactly like the parallel workers do
+            g = GraphFromArrays(self.g.number_of_nodes(), edges, weights)
+            num_threads = IterationThreads(1)
+            # The iterations seed the global generators of this process, the caller gets its own states back
+            with PreservedRandomState():
+                for i, seed in enumerate(seeds):
+                    votes.add(ResearchIteration(g, scored_edges, i, seed, num_threads=num_threads, **params))
 
         print("Finished the K iterations\n")
-        print("Calculating the statistical matrix ..\n")
-        M_Stat, summed_matrices = CalculateStatistics(similarity_matrix_list, self.K)
+        # RefineGraph reads the percentages of the scored edges straight from the accumulator
+        if votes.num_iterations != self.K:
+            raise ValueError(f"Expected K={self.K} iterations but {votes.num_iterations} were counted.")
         print("Refining the graph based on threshold 2 ..\n")
-        G_R = RefineGraph(self.g.copy(), M_Stat, self.t2)
-        return G_R, summed_matrices
+        G_R, self.kept_edges, self.removed_edges = RefineGraph(self.g.copy(), votes, self.t2, edges)
+        return G_R, votes
+
+
+def ResearchIteration(g, edges, i, seed, d, t1, p, K, num_threads=CPU_COUNT):
+    """
+    Run one iteration of the research plan: edge removal, MLNE embedding and similarity scoring.
+
+    Args:
+        g (networkx.Graph): The graph, it is copied before edges are removed.
+        edges (numpy.ndarray): The (E, 2) edge array to score, or None to score all the pairs of nodes.
+        i (int): Index of the iteration.
+        seed (int): Seed of every random number generator used by the iteration.
+        d, t1, p, K: See ResearchPlan.
+        num_threads (int): The threads of the native walkers, trainer and ACO deposits of this iteration.
+
+    Returns:
+        numpy.ndarray or scipy.sparse.csr_matrix: The per-edge vector or the similarity matrix of this iteration.
+    """
+    print(f"\nIteration number {i+1} of total {K} iterations:\n")
+    SeedIteration(seed)
+    original_graph = g.copy()
+    print(f"\tRandomly remove {p}% of the graph's edges\n")
+    g_tag = RemoveEdges(original_graph, p)
+
+    # loads the model with the embedding method and coarsening method
+    model = MLNE(
+        graph=g_tag,
+        dimension=d,
+        # MLNE passes its own num_threads to the levels it trains concurrently, the others get the whole budget
+        Model=lambda graph, dimension, num_threads=num_threads, **kwargs: Node2Vec(graph, dimension=dimension, batch_size=Config.NODE2VEC_BATCH_SIZE, iterations=Config.NODE2VEC_ITERATIONS, p=Config.NODE2VEC_P, q=Config.NODE2VEC_Q, streaming=Config.NODE2VEC_STREAMING, backend=Config.NODE2VEC_BACKEND, sparse=Config.NODE2VEC_SPARSE, num_threads=num_threads, **kwargs),
+        Coarsening=lambda graph: ACOCoarsening(graph, phe_power=Config.ALPHA, iterations=Config.ACO_COARSENING_ITERATIONS, num_threads=min(20, num_threads)),
+        num_scales=Config.PYRAMID_SCALES,
+        num_workers=Config.MLNE_WORKERS,
+        warm_start=Config.MLNE_WARM_START,
+        warm_start_iterations=Config.MLNE_WARM_START_ITERATIONS,
+        num_threads=num_threads
+    )
+    # start the process and receive the embedding matrix
+    embedding_matrix = model.train().get_embeddings()
+    print("\tCalculating the similarity matrix based on threshold 1 ..\n")
+    if edges is not None:
+        return CalculateEdgeCosineSimilarity(embedding_matrix, edges, t1)
+    return CalculateCosineSimilarity(embedding_matrix, t1)
+
+
+def IterationSeeds(seed, K):
+    """
+    Derive one independent seed per iteration from a master seed (a random one when seed is None).
+    """
+    return [int(child.generate_state(1)[0]) for child in np.random.SeedSequence(seed).spawn(K)]
+
+
+def SeedIteration(seed):
+    """
+    Seed the Python, numpy, torch and native random number generators of the calling thread.
+    """
+    random.seed(seed)
+    np.random.seed(seed)
+    torch.manual_seed(seed)
+    set_random_seed(seed)
+
+
+def IterationThreads(num_workers):
+    """
+    The thread budget of every iteration when num_workers iterations run at the same time.
+    """
+    return max(1, CPU_COUNT // num_workers)
+
+
+@contextmanager
+def PreservedRandomState():
+    """
+    Restore the Python, numpy and torch random states of the caller when the block exits.
+
+    The native generator of the calling thread cannot be read back, it is reseeded from fresh entropy
+    instead, the same way it is seeded when a thread starts.
+    """
+    python_state = random.getstate()
+    numpy_state = np.random.get_state()
+    torch_state = torch.get_rng_state()
+    cuda_states = torch.cuda.get_rng_state_all() if torch.cuda.is_available() else None
+    try:
+        yield
+    finally:
+        random.setstate(python_state)
+        np.random.set_state(numpy_state)
+        torch.set_rng_state(torch_state)
+        if cuda_states is not None:
+            torch.cuda.set_rng_state_all(cuda_states)
+        set_random_seed(int(np.random.SeedSequence().generate_state(1)[0]))
+
+
+def CheckNodeLabels(g):
+    """
+    Raise a ValueError unless the nodes of g are exactly the integers 0..N-1.
+
+    The iterations rebuild the graph from its edge array over range(N) and index the embedding rows and
+    the vote counts by node, so any other labels would silently score the wrong pairs.
+    """
+    if set(g.nodes()) != set(range(g.number_of_nodes())):
+        raise ValueError("The nodes of the graph must be labeled 0..N-1, "
+                         "relabel them first (e.g. networkx.convert_node_labels_to_integers).")
+
+
+def GraphFromArrays(num_nodes, edges, weights):
+    """
+    Build a weighted networkx graph over the nodes 0..num_nodes-1 from an edge array.
+    """
+    g = nx.Graph()
+    g.add_nodes_from(range(num_nodes))
+    g.add_weighted_edges_from(zip(edges[:, 0].tolist(), edges[:, 1].tolist(), weights.tolist()))
+    return g
+
+
+def ParallelIterations(num_nodes, edges, weights, scored, seeds, params, num_workers):
+    """
+    Run the research iterations on a process pool and yield their results as they arrive.
+
+    The edge and weight arrays are placed once in shared memory, every worker rebuilds the graph
+    from them a single time instead of receiving a pickled networkx graph per iteration.
+
+    Args:
+        num_nodes (int): The number of nodes in the graph.
+        edges (numpy.ndarray): The (E, 2) edge array of the graph.
+        weights (numpy.ndarray): The weight of every edge.
+        scored (bool): Score only the edges rather than all the pairs of nodes.
+        seeds (list of int): One seed per iteration (see IterationSeeds).
+        params (dict): The keyword arguments of ResearchIteration.
+        num_workers (int): The number of worker processes.
+
+    Yields:
+        numpy.ndarray or scipy.sparse.csr_matrix: The result of each iteration, in completion order.
+    """
+    edges = np.ascontiguousarray(edges, dtype=np.int64)
+    weights = np.ascontiguousarray(weights, dtype=np.float64)
+    shm = shared_memory.SharedMemory(create=True, size=max(1, edges.nbytes + weights.nbytes))
+    try:
+        np.ndarray(edges.shape, dtype=np.int64, buffer=shm.buf)[:] = edges
+        np.ndarray(weights.shape, dtype=np.float64, buffer=shm.buf, offset=edges.nbytes)[:] = weights
+
+        # spawn works the same on every platform and does not fork the torch/native threads
+        context = mp.get_context("spawn")
+        initargs = (shm.name, num_nodes, len(edges), scored, params, Config.to_dict(), num_workers)
+        with context.Pool(num_workers, initializer=_InitWorker, initargs=initargs) as pool:
+            yield from pool.imap_unordered(_RunWorkerIteration, list(enumerate(seeds)))
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+_worker = {}
+
+
+def _InitWorker(shm_name, num_nodes, num_edges, scored, params, config, num_workers):
+    Config.from_dict(config)
+    # Share the cores between the workers instead of every process using all of them
+    num_threads = IterationThreads(num_workers)
+    torch.set_num_threads(num_threads)
+    shm = shared_memory.SharedMemory(name=shm_name)
+    edges = np.ndarray((num_edges, 2), dtype=np.int64, buffer=shm.buf).copy()
+    weights = np.ndarray((num_edges,), dtype=np.float64, buffer=shm.buf, offset=edges.nbytes).copy()
+    shm.close()
+    _worker["graph"] = GraphFromArrays(num_nodes, edges, weights)
+    _worker["edges"] = edges if scored else None
+    _worker["params"] = dict(params, num_threads=num_threads)
+
+
+def _RunWorkerIteration(task):
+    i, seed = task
+    return ResearchIteration(_worker["graph"], _worker["edges"], i, seed, **_worker["params"])
+
+
+def PairKeys(us, vs, num_nodes):
+    """
+    Hash node index pairs to one integer per unordered pair, so (u, v) and (v, u) get the same key.
+    """
+    us = np.asarray(us, dtype=np.int64)
+    vs = np.asarray(vs, dtype=np.int64)
+    return np.minimum(us, vs) * num_nodes + np.maximum(us, vs)
+
+
+def SortedLookup(keys, sorted_keys):
+    """
+    Vectorized lookup of keys in a sorted key array.
+
+    Returns:
+        tuple: The position of every key in sorted_keys (clipped to a valid index) and whether it was found there.
+    """
+    if len(sorted_keys) == 0:
+        return np.zeros(len(keys), dtype=np.int64), np.zeros(len(keys), dtype=bool)
+    positions = np.minimum(np.searchsorted(sorted_keys, keys), len(sorted_keys) - 1)
+    return positions, sorted_keys[positions] == keys
+
+
+class VoteAccumulator:
+    """
+    Counts in how many of the K iterations every scored pair passed threshold 1.
+
+    With an edge array the counts are a compact vector aligned with its rows, otherwise they are
+    a sparse num_nodes x num_nodes matrix holding the pairs that passed at least once.
+    Either way the memory does not grow with K.
+    """
+
+    def __init__(self, K, edges=None, num_nodes=None):
+        self.K = K
+        self.edges = edges
+        self.num_nodes = num_nodes if num_nodes is not None else int(edges.max()) + 1
+        self.num_iterations = 0
+        self.dtype = np.uint8 if K <= np.iinfo(np.uint8).max else np.uint16
+        if edges is not None:
+            self.counts = np.zeros(len(edges), dtype=self.dtype)
+        else:
+            self.counts = csr_matrix((self.num_nodes, self.num_nodes), dtype=self.dtype)
+        self._sorted_keys = None
+        self._key_order = None
+
+    def add(self, similarity):
+        """
+        Fold the result of one iteration into the counts.
+
+        Args:
+            similarity (numpy.ndarray or scipy.sparse.csr_matrix): The binary per-edge vector
+                (see CalculateEdgeCosineSimilarity) or the sparse similarity matrix (see CalculateCosineSimilarity).
+        """
+        if self.num_iterations >= self.K:
+            raise ValueError(f"All the K={self.K} iterations were already counted.")
+        if self.edges is not None:
+            if similarity.shape != self.counts.shape:
+                raise ValueError("The similarity vector must have one entry per edge.")
+            self.counts += similarity.astype(self.dtype, copy=False)
+        else:
+            if similarity.shape != self.counts.shape:
+                raise ValueError("All matrices must have the same dimensions.")
+            self.counts = (self.counts + similarity).astype(self.dtype)
+        self.num_iterations += 1
+
+    def percentages(self):
+        """
+        Returns:
+            numpy.ndarray or scipy.sparse.csr_matrix: The counts as percentages of K.
+        """
+        return (self.counts / self.K) * 100
+
+    def counts_for(self, edges):
+        """
+        Look up the counts of the given node pairs, in either orientation.
+
+        Args:
+            edges (array-like): A sequence of (u, v) pairs.
+
+        Returns:
+            numpy.ndarray: One count per pair, 0 for pairs that were never scored.
+        """
+        edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+        if self.edges is None:
+            return self.counts[edges[:, 0], edges[:, 1]].A1
+
+        if self._sorted_keys is None:
+            keys = PairKeys(self.edges[:, 0], self.edges[:, 1], self.num_nodes)
+            self._key_order = np.argsort(keys)
+            self._sorted_keys = keys[self._key_order]
+
+        positions, found = SortedLookup(PairKeys(edges[:, 0], edges[:, 1], self.num_nodes), self._sorted_keys)
+        result = np.zeros(len(edges), dtype=self.dtype)
+        result[found] = self.counts[self._key_order[positions[found]]]
+        return result
+
+    def percentages_for(self, edges):
+        """
+        Same as counts_for, as percentages of K.
+        """
+        return (self.counts_for(edges) / self.K) * 100
+
+    def __getitem__(self, pair):
+        return self.counts_for([pair])[0]
 
 # result = evaluate({lookup.index_to_label(index):embedding[index] for index in range(g.number_of_nodes())}, labels, clf_ratio=0.5)
 # print(result)
@@ -81,46 +374,93 @@ def RemoveEdges(g, p):
     return g
 
 
-def CalculateCosineSimilarity(embedding_matrix, t1):
+def EdgeArray(g):
     """
-    Calculate the cosine similarity matrix with sigmoid normalization and thresholding.
+    Collect the edges of the graph g into an integer array.
+
+    Args:
+        g (networkx.Graph): The input graph, with integer node labels.
+
+    Returns:
+        numpy.ndarray: An (E, 2) array holding one (u, v) row per edge, in g.edges order.
+    """
+    num_edges = g.number_of_edges()
+    edges = np.fromiter((node for edge in g.edges() for node in edge), dtype=np.int64, count=2 * num_edges)
+    return edges.reshape(num_edges, 2)
+
+
+def NormalizeRows(embedding_matrix):
+    """
+    Scale every row of the embedding matrix to unit length, leaving all-zero rows as they are.
+    """
+    norms = np.linalg.norm(embedding_matrix, axis=1, keepdims=True)
+    return embedding_matrix / np.where(norms == 0, 1, norms)
+
+
+def CalculateEdgeCosineSimilarity(embedding_matrix, edges, t1, block_size=65536):
+    """
+    Calculate the thresholded cosine similarity of the two endpoints of every edge.
 
     Args:
         embedding_matrix (numpy.ndarray): A matrix where each row is a vector embedding.
+        edges (numpy.ndarray): An (E, 2) array of node pairs (see EdgeArray).
         t1 (float): Threshold for cosine similarity.
+        block_size (int): Number of edges gathered at once, bounds the temporary memory.
 
     Returns:
-        numpy.ndarray: A binary similarity matrix.
+        numpy.ndarray: A binary vector with one entry per edge.
     """
-    num_vectors = embedding_matrix.shape[0]
-    similarity_matrix = np.zeros((num_vectors, num_vectors), dtype=int)
+    normalized = NormalizeRows(embedding_matrix)
 
-    for m in range(num_vectors):
-        for n in range(m, num_vectors):
-            # Compute cosine similarity
-            v_m = embedding_matrix[m]
-            v_n = embedding_matrix[n]
-            dot_product = np.dot(v_m, v_n)
-            magnitude_m = np.linalg.norm(v_m)
-            magnitude_n = np.linalg.norm(v_n)
-            res = dot_product / (magnitude_m * magnitude_n)
+    similarity_vector = np.zeros(len(edges), dtype=np.int8)
+    for start in range(0, len(edges), block_size):
+        block = edges[start:start + block_size]
+        # Row-wise dot product of the normalized endpoints = cosine similarity
+        res = np.einsum('ij,ij->i', normalized[block[:, 0]], normalized[block[:, 1]])
+        similarity_vector[start:start + block_size] = res >= t1
 
-            # Normalize the results from range [-1,1] to [0,1]
-            # res = (res + 1)/2
+    return similarity_vector
 
-            # Normalize with sigmoid
-            # res = expit(res)
 
-            # Apply threshold
-            if res < t1:
-                similarity_matrix[m, n] = False
-            else:
-                similarity_matrix[m, n] = True
+def CalculateCosineSimilarity(embedding_matrix, t1, block_size=1024, num_threads=1):
+    """
+    Calculate the thresholded cosine similarity of every pair of vectors.
 
-            # Symmetry: Copy value for the lower triangular part
-            similarity_matrix[n, m] = similarity_matrix[m, n]
+    The embeddings are normalized once and multiplied one tile of rows at a time, so the peak
+    memory is bounded by block_size x N instead of N x N. Only the pairs that pass t1 are kept.
 
-    return similarity_matrix
+    Args:
+        embedding_matrix (numpy.ndarray): A matrix where each row is a vector embedding.
+        t1 (float): Threshold for cosine similarity.
+        block_size (int): Number of rows in each tile.
+        num_threads (int): Number of tiles processed concurrently.
+
+    Returns:
+        scipy.sparse.csr_matrix: A binary, symmetric similarity matrix holding the pairs >= t1.
+    """
+    normalized = NormalizeRows(embedding_matrix)
+    num_vectors = normalized.shape[0]
+
+    def similarity_tile(start):
+        # Only the upper triangular part is computed, the lower part is its mirror
+        res = normalized[start:start + block_size] @ normalized[start:].T
+        rows, cols = np.nonzero(res >= t1)
+        upper = cols >= rows
+        return rows[upper] + start, cols[upper] + start
+
+    starts = range(0, num_vectors, block_size)
+    if num_threads > 1:
+        with ThreadPoolExecutor(max_workers=num_threads) as executor:
+            tiles = list(executor.map(similarity_tile, starts))
+    else:
+        tiles = [similarity_tile(start) for start in starts]
+
+    rows = np.concatenate([tile_rows for tile_rows, _ in tiles] + [np.zeros(0, dtype=np.intp)])
+    cols = np.concatenate([tile_cols for _, tile_cols in tiles] + [np.zeros(0, dtype=np.intp)])
+    off_diagonal = rows != cols
+    rows, cols = np.concatenate([rows, cols[off_diagonal]]), np.concatenate([cols, rows[off_diagonal]])
+    data = np.ones(len(rows), dtype=np.int8)
+    return csr_matrix((data, (rows, cols)), shape=(num_vectors, num_vectors))
 
 
 def CalculateStatistics(similarity_matrix_list, K):
@@ -128,12 +468,19 @@ def CalculateStatistics(similarity_matrix_list, K):
     Calculate the statistical matrix from a list of boolean similarity matrices.
 
     Args:
-        similarity_matrix_list (list of numpy.ndarray): A list of boolean similarity matrices.
+        similarity_matrix_list (list of numpy.ndarray or scipy.sparse.csr_matrix, or VoteAccumulator):
+            A list of boolean similarity matrices, or the accumulator they were already folded into.
         int K number of matrices in the similarity_matrix_list
 
     Returns:
-        numpy.ndarray: The calculated statistical matrix with percentage values.
+        numpy.ndarray or scipy.sparse.csr_matrix: The calculated statistical matrix with percentage values.
     """
+    if isinstance(similarity_matrix_list, VoteAccumulator):
+        votes = similarity_matrix_list
+        if votes.num_iterations != K:
+            raise ValueError(f"Expected K={K} iterations but {votes.num_iterations} were counted.")
+        return votes.percentages(), votes
+
     if not similarity_matrix_list:
         raise ValueError("The similarity matrix list is empty.")
 
@@ -143,11 +490,14 @@ def CalculateStatistics(similarity_matrix_list, K):
         if matrix.shape != shape:
             raise ValueError("All matrices in the list must have the same dimensions.")
 
-    summed_matrix = np.zeros(shape, dtype=int)
+    if issparse(similarity_matrix_list[0]):
+        summed_matrix = csr_matrix(shape, dtype=int)
+    else:
+        summed_matrix = np.zeros(shape, dtype=int)
 
     # Iterate through each matrix and sum them as True=1 False=0
     for matrix in similarity_matrix_list:
-        summed_matrix += matrix
+        summed_matrix = summed_matrix + matrix
 
     # Calculate the statistical matrix
     M_stat = (summed_matrix / K) * 100
@@ -155,27 +505,40 @@ def CalculateStatistics(similarity_matrix_list, K):
     return M_stat, summed_matrix
 
 
-def RefineGraph(g, M_stat, t2):
+def RefineGraph(g, M_stat, t2, edges=None):
     """
     Refine the graph by removing edges based on the statistical matrix and threshold.
 
+    The percentages of all the edges are gathered in one vectorized step and the edges below t2
+    are removed in bulk, so the cost depends on the number of edges rather than on N^2.
+
     Args:
         g (networkx.Graph): The original graph.
-        M_stat (numpy.ndarray): The statistical matrix with percentage values.
+        M_stat (numpy.ndarray or VoteAccumulator): The statistical matrix with percentage values,
+            a vector with one percentage per row of `edges`, or the accumulator of the K iterations.
         t2 (float): The threshold for removing edges.
+        edges (numpy.ndarray, optional): The (E, 2) edge array of g, see EdgeArray.
 
     Returns:
-        networkx.Graph: The refined graph with edges removed based on the threshold.
+        Tuple[networkx.Graph, numpy.ndarray, numpy.ndarray]: The refined graph with edges removed based on
+        the threshold, the array of the kept edges and the array of the removed edges.
     """
-
-    # Iterate over each pair (m, n) in the statistical matrix
-    num_nodes = M_stat.shape[0]
-    for m in range(num_nodes):
-        for n in range(m + 1, num_nodes):  # Only consider upper triangular part to avoid duplicates
-            if M_stat[m, n] < t2:
-                if g.has_edge(m, n):
-                    g.remove_edge(m, n)
-                elif g.has_edge(n, m):
-                    g.remove_edge(n, m)
-
-    return g
+    if edges is None:
+        edges = EdgeArray(g)
+
+    if isinstance(M_stat, VoteAccumulator):
+        percentages = M_stat.percentages_for(edges)
+    elif issparse(M_stat):
+        # Pairs that are missing from a sparse statistical matrix have 0%
+        percentages = M_stat[edges[:, 0], edges[:, 1]].A1
+    elif M_stat.ndim == 2:
+        percentages = M_stat[edges[:, 0], edges[:, 1]]
+    else:
+        percentages = M_stat
+
+    # Self loops sit on the diagonal of the statistical matrix, which is never considered
+    removed = (percentages < t2) & (edges[:, 0] != edges[:, 1])
+    kept_edges, removed_edges = edges[~removed], edges[removed]
+    g.remove_edges_from(removed_edges.tolist())
+
+    return g, kept_edges, removed_edges
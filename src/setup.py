@@ -12,11 +12,11 @@ extra_link_args = []
 
 if platform.system() == "Windows":
     # Use MSVC compatible flags
-    extra_compile_args.extend(['/std:c++14', '/Zi', '/Od'])  # Use C++14 and add debug flags
+    extra_compile_args.extend(['/std:c++14', '/Zi', '/O2'])  # Use C++14, optimize and keep debug info
     extra_link_args.extend(['/DEBUG'])                      # Enable debugging symbols
 else:
     # Use GCC/Clang compatible flags
-    extra_compile_args.extend(['-std=c++14', '-g', '-O0'])  # Enable C++14 with debugging
+    extra_compile_args.extend(['-std=c++14', '-g', '-O3'])  # Enable C++14, optimize and keep debug info
     extra_link_args.extend(['-g'])
 
 # Build setup
@@ -26,8 +26,10 @@ setup(
         sources=[
             'necython/extension.pyx',
             'necython/cpp/aco.cpp',
+            'necython/cpp/coarsening.cpp',
             'necython/cpp/common.cpp',
             'necython/cpp/sampling.cpp',
+            'necython/cpp/sgns.cpp',
             'necython/cpp/walker.cpp',
         ],
         extra_compile_args=extra_compile_args,
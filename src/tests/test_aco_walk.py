@@ -0,0 +1,17 @@
+import numpy as np
+import pytest
+
+from necython import Graph, aco_walk
+
+
+def test_aco_walk_rejects_negative_node_ids():
+    graph = Graph.from_arrays(np.array([-1, 0], dtype=np.int32), np.array([0, 1], dtype=np.int32), np.ones(2))
+    with pytest.raises(ValueError):
+        aco_walk(graph, 1, 5, 1, 1., 0., 1)
+
+
+def test_aco_walk_lists_both_directions():
+    graph = Graph.from_arrays(np.array([0, 1], dtype=np.int32), np.array([1, 2], dtype=np.int32), np.ones(2))
+    src, dst, weight = aco_walk(graph, 2, 5, 1, 1., 0., 1)
+    assert len(src) == len(dst) == len(weight) == 4
+    assert set(zip(src.tolist(), dst.tolist())) == {(0, 1), (1, 0), (1, 2), (2, 1)}
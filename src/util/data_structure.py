@@ -1,50 +1,48 @@
 #coding:utf-8
-from collections import defaultdict
 import heapq
 from pprint import pprint
 
+import numpy as np
+from necython import DisjointSet
+
 class DisjoinSet(object):
+    '''
+    Union-find over the nodes 0..size-1, backed by the native array-based
+    necython.DisjointSet (union by rank, iterative path compression).
+    '''
 
     def __init__(self, size):
         self.size = size
-        self.num_components = size
-        self.arr = list(range(size))
-    
+        self.native = DisjointSet(size)
+
+    @property
+    def num_components(self):
+        return self.native.num_components
+
     def union(self, u, v):
-        u_root = self.find(u)
-        v_root = self.find(v)
-        if u_root!=v_root:
-            self.arr[u_root] = v_root
-            self.num_components -= 1
+        self.native.union(u, v)
+
+    def union_edges(self, src, dst):
+        self.native.union_edges(np.ascontiguousarray(src, dtype=np.int32), np.ascontiguousarray(dst, dtype=np.int32))
 
     def find(self, u):
-        if self.arr[u]==u:
-            return u
-        u_root = self.find(self.arr[u])
-        self.arr[u] = u_root
-        return u_root
-
-    # def make_clusters(self):
-    #     arr = list(map(self.find, self.arr))
-    #     clusters = []
-    #     added = set()
-    #     for index in arr:
-    #         if index in added:
-    #             continue
-    #         added.add(index)
-    #         clusters.append(index)
-    #     cluster_index = {cluster:index for index, cluster in enumerate(clusters)}
-    #     self.node_to_cluster = {node:cluster_index[cluster] for node, cluster in enumerate(arr)}
-    #     self.cluster_to_nodes = {cluster_index[cluster]:[] for cluster in clusters}
-    #     for node, cluster in enumerate(arr):
-    #         self.cluster_to_nodes[cluster_index[cluster]].append(node)
+        return self.native.find(u)
+
+    def labels(self):
+        '''
+        RETURN int32 cluster of every node, clusters are numbered in the order of their smallest node
+        '''
+        return self.native.labels()
+
+    def clusters(self):
+        '''
+        RETURN (offsets, members), the members of cluster c are members[offsets[c]:offsets[c+1]]
+        '''
+        return self.native.clusters()
 
     def make_mapping(self):
-        arr = list(map(self.find, self.arr))
-        mapping = defaultdict(list)
-        for node, cluster in enumerate(arr):
-            mapping[cluster].append(node)
-        return list(mapping.values())
+        offsets, members = self.clusters()
+        return [members[begin:end].tolist() for begin, end in zip(offsets[:-1], offsets[1:])]
 
 class HuffmanTreeNode(object):
 
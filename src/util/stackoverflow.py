@@ -5,17 +5,19 @@ def find_best_trade_off(arr):
     '''
     FOR DETAILS PLEASE REFER TO
     https://stackoverflow.com/questions/2018178/finding-the-best-trade-off-point-on-a-curve
+
+    The distance of point i to the line through the first and last points is
+    proportional to |arr[i] - arr[0] - slope * i|, so the farthest point is
+    found with a single scratch array instead of the N x 2 point matrices.
     '''
+    arr = np.asarray(arr, dtype=np.float64)
     nPoints = len(arr)
-    allCoord = np.vstack((range(nPoints), arr)).T
-    np.array([range(nPoints), arr])
-    firstPoint = allCoord[0]
-    lineVec = allCoord[-1] - allCoord[0]
-    lineVecNorm = lineVec / np.sqrt(np.sum(lineVec**2))
-    vecFromFirst = allCoord - firstPoint
-    scalarProduct = np.sum(vecFromFirst * np.tile(lineVecNorm, (nPoints, 1)), axis=1)
-    vecFromFirstParallel = np.outer(scalarProduct, lineVecNorm)
-    vecToLine = vecFromFirst - vecFromFirstParallel
-    distToLine = np.sqrt(np.sum(vecToLine ** 2, axis=1))
-    idxOfBestPoint = np.argmax(distToLine)
-    return idxOfBestPoint
\ No newline at end of file
+    if nPoints < 3:
+        return 0
+    slope = (arr[-1] - arr[0]) / (nPoints - 1)
+    offsets = np.arange(nPoints, dtype=np.float64)
+    offsets *= -slope
+    offsets += arr
+    offsets -= arr[0]
+    np.abs(offsets, out=offsets)
+    return int(np.argmax(offsets))